@@ -41,6 +41,11 @@ import getopt
 import operator
 import webbrowser
 import struct
+import copy
+import heapq
+import array
+import re
+import multiprocessing
 from math import *
 from time import time
 from tkinter import *
@@ -116,6 +121,9 @@ class Application(Frame):
         self.cutperim       = BooleanVar()
         self.disable_arcs   = BooleanVar()
         self.no_comments    = BooleanVar()
+        self.compact        = BooleanVar()
+        self.adaptive       = BooleanVar()
+        self.scallop_slope  = BooleanVar()
         self.origin         = StringVar()
         self.yscale         = StringVar()
         self.Xscale         = StringVar()
@@ -144,6 +152,7 @@ class Application(Frame):
         self.ROUGH_CUTPERIM = BooleanVar()
         self.units          = StringVar()
         self.plungetype     = StringVar()
+        self.ramp_angle     = StringVar()
         self.lace_bound     = StringVar()
         self.cangle         = StringVar()
         self.tolerance      = StringVar()
@@ -152,6 +161,17 @@ class Application(Frame):
         self.gpre           = StringVar()
         self.gpost          = StringVar()
         self.maxcut         = StringVar()
+        self.processes      = StringVar()
+        self.window         = StringVar()
+        self.clearance      = StringVar()
+        self.link_dist      = StringVar()
+        self.order_time     = StringVar()
+        self.scallop        = StringVar()
+        self.feed_max       = StringVar()
+        self.rest_min       = StringVar()
+        self.max_rates      = StringVar()
+        self.max_accels     = StringVar()
+        self.aunits         = StringVar()
         '''#######################################################################
         #                         INITIALIZE VARIABLES                            #
         #    if you want to change a default setting this is the place to do it   #
@@ -163,14 +183,17 @@ class Application(Frame):
         self.cutperim.set(1)
         self.disable_arcs.set(1)
         self.no_comments.set(1)
+        self.compact.set(0)
+        self.adaptive.set(0)
+        self.scallop_slope.set(0)
         self.yscale.set('100')
         self.Xscale.set('0')
         self.pixsize.set('0')
         self.toptol.set('-0.005')
         self.tool.set('Ball') # Options are 'Ball', 'V', 'Flat'
         self.v_angle.set('45')
-        self.scanpat.set('Rows') # Options are 'Rows', 'Columns', 'R then C', 'C then R'
-        self.scandir.set('Alternating') # Options are 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill'
+        self.scanpat.set('Rows') # Options are 'Rows', 'Columns', 'R then C', 'C then R', 'Spiral', 'Auto'
+        self.scandir.set('Alternating') # Options are 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill', 'Auto'
         self.f_feed.set('400')
         self.p_feed.set('250')
         self.stepover.set('1.0')
@@ -179,31 +202,44 @@ class Application(Frame):
         self.dia.set('6.0')
         self.ROUGH_TOOL.set('Ball') # Options are 'Ball', 'V', 'Flat'
         self.ROUGH_V_ANGLE.set('45')
-        self.scanpat.set('Rows') # Options are 'Rows', 'Columns', 'R then C', 'C then R'
-        self.scandir.set('Alternating') # Options are 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill'
+        self.scanpat.set('Rows') # Options are 'Rows', 'Columns', 'R then C', 'C then R', 'Spiral', 'Auto'
+        self.scandir.set('Alternating') # Options are 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill', 'Auto'
         self.ROUGH_R_FEED.set('400')
         self.ROUGH_P_FEED.set('250')
         self.ROUGH_STEPOVER.set('1.0')
         self.ROUGH_DEPTH_PP.set('1.0')
         self.ROUGH_OFFSET.set('0.25')
         self.ROUGH_DIA.set('5')
-        self.ROUGH_SCANPAT.set('Rows')
-        self.ROUGH_SCANDIR.set('Alternating') # Options are 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill'
+        self.ROUGH_SCANPAT.set('Rows') # Options are 'Rows', 'Columns', 'R then C', 'C then R', 'Waterline', 'Auto'
+        self.ROUGH_SCANDIR.set('Alternating') # Options are 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill', 'Auto'
         self.ROUGH_CUTPERIM.set(1)
         self.origin.set('Default')  # Options are 'Default', 'Top-Left', 'Top-Center', 'Top-Right', 'Mid-Left', 'Mid-Center', 'Mid-Right', 'Bot-Left', 'Bot-Center', 'Bot-Right'
         self.units.set('mm') # Options are 'mm' or 'in'
-        self.plungetype.set('simple')
+        self.plungetype.set('simple')  # Options are 'simple', 'arc' or 'ramp'
+        self.ramp_angle.set('5.0')     # degrees, for the 'ramp' plunge type
         self.lace_bound.set('None') # Options 'Full', 'None', '??'
         self.cangle.set('45.0')
         self.tolerance.set('0.025')
         self.splitstep.set('0')        # Options
+        self.processes.set('1')        # 1 = no worker processes
+        self.window.set('0')           # 0 = simplify whole scanlines
+        self.clearance.set('0')        # 0 = always retract to Z safe
+        self.link_dist.set('0')        # 0 = no stay-down links
+        self.order_time.set('0')       # 0 = cut spans in scan order
+        self.scallop.set('0')          # 0 = the stepover sets the line spacing
+        self.feed_max.set('100')       # 100 = every cut at the feed rate
+        self.rest_min.set('0')         # 0 = finish the whole surface
+        self.max_rates.set('5000|5000|2000') # X|Y|Z for the cycle time estimate
+        self.max_accels.set('500|500|250')   # X|Y|Z for the cycle time estimate
         self.HOME_DIR = os.path.expanduser('~')
         self.CONFIG_FILE = (os.path.join(self.HOME_DIR, 'dmap2gcode.ngc'))
         self.NGC_FILE = (os.path.join(self.HOME_DIR, 'None'))
         self.IMAGE_FILE = (os.path.join(self.HOME_DIR, 'None'))
+        self.STOCK_FILE = (os.path.join(self.HOME_DIR, 'None'))
         self.aspect_ratio =  0
         self.SCALE = 1
         self.gcode = []
+        self.stats = None
         self.segID = []
         # pan and zoom stuff
         self.panx = 0
@@ -213,9 +249,11 @@ class Application(Frame):
         # derived variables
         if self.units.get() == 'in':
             self.funits.set('in/min')
+            self.aunits.set('in/s^2')
         else:
             self.units.set('mm')
             self.funits.set('mm/min')
+            self.aunits.set('mm/s^2')
         self.ui_TKimage = PhotoImage(format='gif',data=
          'R0lGODdhggDpAIAAAAAAAP///ywAAAAAggDpAAAC/oyPqcvtD6OctNqLs968'
         +'+w+G4kiW5ommCMC27uuqsgjXNjzn1833rQ5s+IbEoJGILBplyaZyWXJKn9DP'
@@ -356,12 +394,12 @@ class Application(Frame):
         self.v_angle.trace_variable('w', self.Entry_Vangle_Callback)
         self.Label_gcode_opt = Label(self.master,text='Finish Gcode Properties:', anchor=W)
         self.Label_Scanpat      = Label(self.master,text='Scan Pattern', anchor=E)
-        self.ScanPat_OptionMenu = OptionMenu(root, self.scanpat, 'Rows','Columns', 'R then C', 'C then R')
+        self.ScanPat_OptionMenu = OptionMenu(root, self.scanpat, 'Rows','Columns', 'R then C', 'C then R', 'Spiral', 'Auto')
         self.Label_CutPerim = Label(self.master,text='Cut Perimeter')
         self.Checkbutton_CutPerim = Checkbutton(self.master,text=' ', anchor=W, command=self.Set_Input_States)
         self.Checkbutton_CutPerim.configure(variable=self.cutperim)
         self.Label_Scandir      = Label(self.master,text='Cut Direction', anchor=E)
-        self.ScanDir_OptionMenu = OptionMenu(root, self.scandir, 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill')
+        self.ScanDir_OptionMenu = OptionMenu(root, self.scandir, 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill', 'Auto')
         self.Label_Feed = Label(self.master,text='Feed Rate', anchor=E)
         self.Label_Feed_u = Label(self.master,textvariable=self.funits, anchor=W)
         self.Entry_Feed = Entry(self.master,width='15')
@@ -410,12 +448,12 @@ class Application(Frame):
         self.ROUGH_V_ANGLE.trace_variable('w', self.ROUGH_Entry_Vangle_Callback)
         self.ROUGH_Label_gcode_opt = Label(self.master,text='Roughing Gcode Properties:', anchor=W)
         self.ROUGH_Label_Scanpat      = Label(self.master,text='Scan Pattern', anchor=E)
-        self.ROUGH_ScanPat_OptionMenu = OptionMenu(self.master, self.ROUGH_SCANPAT, 'Rows','Columns', 'R then C', 'C then R')
+        self.ROUGH_ScanPat_OptionMenu = OptionMenu(self.master, self.ROUGH_SCANPAT, 'Rows','Columns', 'R then C', 'C then R', 'Waterline', 'Auto')
         self.ROUGH_Label_CutPerim = Label(self.master,text='Cut Perimeter')
         self.ROUGH_Checkbutton_CutPerim = Checkbutton(self.master,text=' ', anchor=W, command=self.Set_Input_States)
         self.ROUGH_Checkbutton_CutPerim.configure(variable=self.ROUGH_CUTPERIM)
         self.ROUGH_Label_Scandir      = Label(self.master,text='Cut Direction', anchor=E)
-        self.ROUGH_ScanDir_OptionMenu = OptionMenu(self.master, self.ROUGH_SCANDIR, 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill')
+        self.ROUGH_ScanDir_OptionMenu = OptionMenu(self.master, self.ROUGH_SCANDIR, 'Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill', 'Auto')
         self.ROUGH_Label_Feed = Label(self.master,text='Feed Rate', anchor=E)
         self.ROUGH_Label_Feed_u = Label(self.master,textvariable=self.funits, anchor=W)
         self.ROUGH_Entry_Feed = Entry(self.master,width='15')
@@ -451,7 +489,18 @@ class Application(Frame):
         self.Entry_Sspeed=Entry()
         self.Entry_BoxGap = Entry()
         self.Entry_ContAngle = Entry()
+        self.Entry_RampAngle = Entry()
         self.Entry_Tolerance = Entry()
+        self.Entry_Processes = Entry()
+        self.Entry_Window = Entry()
+        self.Entry_Clearance = Entry()
+        self.Entry_LinkDist = Entry()
+        self.Entry_OrderTime = Entry()
+        self.Entry_Scallop = Entry()
+        self.Entry_FeedMax = Entry()
+        self.Entry_RestMin = Entry()
+        self.Entry_MaxRates = Entry()
+        self.Entry_MaxAccels = Entry()
 
         # #ROUGH Setting Window Entry initializations
         # self.ROUGH_Entry_ToolDIA=Entry()
@@ -467,8 +516,12 @@ class Application(Frame):
         top_File = Menu(self.menuBar, tearoff=0)
         top_File.add('command', label = 'Open G-Code File', command = self.menu_File_Open_G_Code_File)
         top_File.add('command', label = 'Open Image File', command = self.menu_File_Open_IMAGE_File)
+        top_File.add('command', label = 'Open Stock Map File', command = self.menu_File_Open_STOCK_File)
+        top_File.add('command', label = 'Clear Stock Map', command = self.menu_File_Clear_STOCK_File)
         top_File.add('command', label = 'Save Finish G-Code File', command = self.menu_File_Save_G_Code_File_Finish)
         top_File.add('command', label = 'Save Roughing G-Code File', command = self.menu_File_Save_G_Code_File_Rough)
+        top_File.add('command', label = 'Save Finish Toolpath File', command = self.menu_File_Save_Toolpath_File)
+        top_File.add('command', label = 'Save G-Code File From Toolpath', command = self.menu_File_Toolpath_G_Code_File)
         if IN_AXIS:
             top_File.add('command', label = 'Write To Axis and Exit', command = self.WriteToAxis)
         else:
@@ -578,7 +631,7 @@ class Application(Frame):
         self.statusMessage.set(f"Configuration File Saved: {self.CONFIG_FILE}")
         self.statusbar.configure( bg = 'white' )
 
-    def WriteGCode(self, rough_flag = 0, config_file=False):
+    def WriteGCode(self, rough_flag = 0, config_file=False, target=None):
         global Zero
         header = []
         if (self.no_comments.get() != True) or (config_file == True):
@@ -594,6 +647,9 @@ class Application(Frame):
             header.append(f"(dmap2gcode_set cutperim       {int(self.cutperim.get())} )")
             header.append(f"(dmap2gcode_set disable_arcs   {int(self.disable_arcs.get())} )")
             header.append(f"(dmap2gcode_set no_comments    {int(self.no_comments.get())} )")
+            header.append(f"(dmap2gcode_set compact        {int(self.compact.get())} )")
+            header.append(f"(dmap2gcode_set adaptive       {int(self.adaptive.get())} )")
+            header.append(f"(dmap2gcode_set scallop_slope  {int(self.scallop_slope.get())} )")
             # STRING.get()
             header.append(f"(dmap2gcode_set yscale         {self.yscale.get()} )")
             header.append(f"(dmap2gcode_set toptol         {self.toptol.get()} )")
@@ -607,16 +663,28 @@ class Application(Frame):
             header.append(f"(dmap2gcode_set tool           {self.tool.get()} )")
             header.append(f"(dmap2gcode_set units          {self.units.get()} )")
             header.append(f"(dmap2gcode_set plunge         {self.plungetype.get()} )")
+            header.append(f"(dmap2gcode_set ramp_angle     {self.ramp_angle.get()} )")
             header.append(f"(dmap2gcode_set feed           {self.f_feed.get()} )")
             header.append(f"(dmap2gcode_set lace           {self.lace_bound.get()} )")
             header.append(f"(dmap2gcode_set cangle         {self.cangle.get()} )")
             header.append(f"(dmap2gcode_set tolerance      {self.tolerance.get()} )")
             header.append(f"(dmap2gcode_set splitstep      {self.splitstep.get()} )")
+            header.append(f"(dmap2gcode_set processes      {self.processes.get()} )")
+            header.append(f"(dmap2gcode_set window         {self.window.get()} )")
+            header.append(f"(dmap2gcode_set clearance      {self.clearance.get()} )")
+            header.append(f"(dmap2gcode_set link_dist      {self.link_dist.get()} )")
+            header.append(f"(dmap2gcode_set order_time     {self.order_time.get()} )")
+            header.append(f"(dmap2gcode_set scallop        {self.scallop.get()} )")
+            header.append(f"(dmap2gcode_set feed_max       {self.feed_max.get()} )")
+            header.append(f"(dmap2gcode_set rest_min       {self.rest_min.get()} )")
+            header.append(f"(dmap2gcode_set max_rates      {self.max_rates.get()} )")
+            header.append(f"(dmap2gcode_set max_accels     {self.max_accels.get()} )")
             header.append(f"(dmap2gcode_set gpre          '{self.gpre.get()}' )")
             header.append(f"(dmap2gcode_set gpost         '{self.gpost.get()}' )")
             header.append(f"(dmap2gcode_set scanpat       '{self.scanpat.get()}' )")
             header.append(f"(dmap2gcode_set scandir       '{self.scandir.get()}' )")
             header.append(f"(dmap2gcode_set imagefile     '{self.IMAGE_FILE}' )")
+            header.append(f"(dmap2gcode_set stockfile     '{self.STOCK_FILE}' )")
             header.append(f"(dmap2gcode_set ROUGH_TOOL     {self.ROUGH_TOOL.get()} )")
             header.append(f"(dmap2gcode_set ROUGH_DIA      {self.ROUGH_DIA.get()} )")
             header.append(f"(dmap2gcode_set ROUGH_V_ANGLE  {self.ROUGH_V_ANGLE.get()} )")
@@ -633,6 +701,7 @@ class Application(Frame):
             self.gcode = []
             self.gcode = header
             return
+        notes_at = len(header)
         for line in self.gpre.get().split('|'):
             header.append(line)
         postscript = self.gpost.get()
@@ -656,7 +725,6 @@ class Application(Frame):
         tolerance     =  float(self.tolerance.get())
         safe_z        =  float(self.z_safe.get())
         splitstep     =  float(self.splitstep.get())
-        toptol        =  float(self.toptol.get())
         depth         = -float(self.z_cut.get())
         Cont_Angle    =  float(self.cangle.get())
         if rough_flag == 0:
@@ -670,23 +738,19 @@ class Application(Frame):
             plunge_feed   =  float(self.p_feed.get())
             step          =  max(1, int(floor( float(self.stepover.get()) / pixel_size)))
             edge_offset   = 0
-            if self.tool.get() == 'Flat':
-                TOOL = make_tool_shape(endmill, tool_diameter, pixel_size)
-            elif self.tool.get() == 'V':
-                v_angle = float(self.v_angle.get())
-                TOOL = make_tool_shape(vee_common(v_angle), tool_diameter, pixel_size)
-            else: #'Ball'
-                TOOL = make_tool_shape(ball_tool, tool_diameter, pixel_size)
-            rows = 0
-            columns = 0
-            columns_first = 0
-            if self.scanpat.get() != 'Columns':
-                rows = 1
-            if self.scanpat.get() != 'Rows':
-                columns = 1
-            if self.scanpat.get() == 'C then R':
-                columns_first = 1
-            converter = self.scandir.get()
+            TOOL = self.Make_Tool(pixel_size)
+            scallop = float(self.scallop.get())
+            scallop_slope = False
+            if scallop > 0 and self.tool.get() != 'Flat':
+                if self.tool.get() == 'V':
+                    profile = vee_common(float(self.v_angle.get()))
+                else:
+                    profile = ball_tool
+                step = max(1, int(floor( scallop_stepover(profile, tool_diameter/2.0, scallop) / pixel_size)))
+                scallop_slope = self.scallop_slope.get()
+            scanpat = self.scanpat.get()
+            scandir = self.scandir.get()
+            patterns = ('Rows', 'Columns', 'R then C', 'C then R', 'Spiral')
             lace_bound_val = self.lace_bound.get()
         else:
             cutperim      =  int(self.ROUGH_CUTPERIM.get())
@@ -700,57 +764,12 @@ class Application(Frame):
             plunge_feed   =  float(self.ROUGH_P_FEED.get())
             step          =  max(1, int(floor( float(self.ROUGH_STEPOVER.get()) / pixel_size)))
             edge_offset = max(0, (tool_diameter - finish_dia)/2.0)
-            if self.ROUGH_TOOL.get() == 'Flat':
-                TOOL = make_tool_shape(endmill, tool_diameter, pixel_size, rough_offset)
-            elif self.tool.get() == 'V':
-                v_angle = float(self.ROUGH_V_ANGLE.get())
-                TOOL = make_tool_shape(vee_common(v_angle), tool_diameter, pixel_size, rough_offset)
-            else: #'Ball'
-                TOOL = make_tool_shape(ball_tool, tool_diameter, pixel_size, rough_offset)
-            rows = 0
-            columns = 0
-            columns_first = 0
-            if self.ROUGH_SCANPAT.get() != 'Columns':
-                rows = 1
-            if self.ROUGH_SCANPAT.get() != 'Rows':
-                columns = 1
-            if self.ROUGH_SCANPAT.get() == 'C then R':
-                columns_first = 1
-            converter = self.ROUGH_SCANDIR.get()
+            TOOL = self.Make_Rough_Tool(pixel_size, rough_offset)
+            scallop_slope = False
+            scanpat = self.ROUGH_SCANPAT.get()
+            scandir = self.ROUGH_SCANDIR.get()
+            patterns = ('Rows', 'Columns', 'R then C', 'C then R', 'Waterline')
             lace_bound_val = self.lace_bound.get()
-        if converter == 'Positive':
-            conv_index = 0
-            #fmessage('Positive')
-        elif converter == 'Negative':
-            conv_index = 1
-            #fmessage('Negative')
-        elif converter == 'Alternating':
-            conv_index = 2
-            #fmessage('Alternating')
-        elif converter == 'Up Mill':
-            conv_index = 3
-            #fmessage('Up Milling')
-        elif converter == 'Down Mill':
-            conv_index = 4
-            #fmessage('Down Mill')
-        else:
-            conv_index = 2
-            fmessage('Converter Error: Setting to, Alternating')
-        if rows: convert_rows = convert_makers[conv_index]()
-        else: convert_rows = None
-        if columns: convert_cols = convert_makers[conv_index]()
-        else: convert_cols = None
-        if lace_bound_val != 'None' and rows and columns:
-            slope = tan( Cont_Angle*pi/180 )
-            if columns_first:
-                convert_rows = Reduce_Scan_Lace(convert_rows, slope, step+1)
-            else:
-                convert_cols = Reduce_Scan_Lace(convert_cols, slope, step+1)
-            if lace_bound_val == 'Full':
-                if columns_first:
-                    convert_cols = Reduce_Scan_Lace(convert_cols, slope, step+1)
-                else:
-                    convert_rows = Reduce_Scan_Lace(convert_rows, slope, step+1)
 
         '''###################################################
         #                start common stuff                  #
@@ -759,14 +778,20 @@ class Application(Frame):
             units = 'G20'
         else:
             units = 'G21'
-        if self.cuttop.get() != True:
-            if rows == 1:
-                convert_rows = Reduce_Scan_Lace_new(convert_rows, toptol, 1)
-            if columns == 1:
-                convert_cols = Reduce_Scan_Lace_new(convert_cols, toptol, 1)
         disable_arcs = self.disable_arcs.get()
+        processes = int(self.processes.get())
+        window = int(self.window.get())
+        clearance = float(self.clearance.get())
+        link_dist = float(self.link_dist.get())
+        order_time = float(self.order_time.get())
+        feed_max = float(self.feed_max.get()) / 100.0
+        max_rates = [float(v) for v in self.max_rates.get().split('|')]
+        max_accels = [float(v) for v in self.max_accels.get().split('|')]
+        adaptive = self.adaptive.get()
         if self.plungetype.get() == 'arc' and not disable_arcs:
             Entry_cut   = ArcEntryCut(plunge_feed, .125)
+        elif self.plungetype.get() == 'ramp':
+            Entry_cut   = RampEntryCut(plunge_feed, float(self.ramp_angle.get()))
         else:
             Entry_cut   = SimpleEntryCut(plunge_feed)
         if self.normalize.get():
@@ -831,10 +856,93 @@ class Application(Frame):
             MAT.mult(-1.0)
         else:
             MAT.minus(depth)
+        STOCK = None
+        fileName, fileExt = os.path.splitext(self.STOCK_FILE)
+        rest_min = float(self.rest_min.get())
+        if rough_flag == 1 and os.path.basename(fileName) != 'None':
+            STOCK = self.Read_stock_file(MAT.width, MAT.height, depth)
+            if STOCK is None:
+                return
+        elif rough_flag == 0 and rest_min > 0:
+            # finish only what the roughing tool left thicker than rest_min
+            STOCK = Image_Matrix()
+            STOCK.From_Array(rough_envelope(MAT,
+                                            self.Make_Rough_Tool(pixel_size, float(self.ROUGH_OFFSET.get())),
+                                            self.Make_Rough_Tool(pixel_size, 0.0)))
+        if 'Auto' in (scanpat, scandir):
+            '''#######################################################
+            # Convert every scan pattern and cut direction the Auto  #
+            # settings leave open at low resolution, in the worker   #
+            # processes when there are some, and make the one with   #
+            # the shortest cycle time at full resolution             #
+            #######################################################'''
+            self.statusMessage.set('Estimating cycle times for Auto')
+            self.update()
+            f = max(1, int(ceil(max(MAT.width, MAT.height) / 100.0)))
+            if rough_flag == 0:
+                TOOL_C = self.Make_Tool(pixel_size * f)
+            else:
+                TOOL_C = self.Make_Rough_Tool(pixel_size * f, rough_offset)
+            MAT_C = coarse_matrix(MAT, f)
+            MAT_C.pad_w_zeros(TOOL_C)
+            STOCK_C = None
+            if STOCK is not None:
+                STOCK_C = coarse_matrix(STOCK, f)
+                STOCK_C.pad_w_zeros(TOOL_C)
+            step_c = max(1, int(round(step / f)))
+            scandirs = ('Alternating', 'Positive', 'Negative', 'Up Mill', 'Down Mill')
+            candidates = []
+            tasks = []
+            for pat in (patterns if scanpat == 'Auto' else (scanpat,)):
+                for sd in (scandirs if scandir == 'Auto' else (scandir,)):
+                    if pat in ('Waterline', 'Spiral') and scandir == 'Auto' and \
+                       sd not in ('Up Mill', 'Down Mill'):
+                        # the loops only go one way or the other
+                        continue
+                    rows_c, cols_c, first_c, waterline_c, spiral_c = \
+                        self.Scan_Converters(pat, sd, step_c, lace_bound_val, Cont_Angle)
+                    lace = lace_bound_val != 'None' and rows_c and cols_c
+                    candidates.append((pat, sd))
+                    tasks.append((MAT_C, units, TOOL_C, pixel_size * f, step_c, safe_z, tolerance,
+                                  feed_rate, rows_c, cols_c, first_c, cutperim, Entry_cut, rough_depth,
+                                  rough_feed, xoffset, yoffset, splitstep, [], '', edge_offset,
+                                  disable_arcs, adaptive and not lace, 1, window, clearance, link_dist,
+                                  order_time, STOCK_C, scallop_slope, feed_max, rest_min, waterline_c,
+                                  MoveStats(max_rates, max_accels, tolerance), spiral_c))
+            if processes > 1:
+                pool = multiprocessing.Pool(processes)
+                try:
+                    estimates = pool.map(estimate_worker, tasks)
+                finally:
+                    pool.terminate()
+            else:
+                estimates = [estimate_worker(task, self) for task in tasks]
+            if STOP_CALC:
+                return
+            best = min(range(len(tasks)), key=lambda k: estimates[k].time)
+            scanpat, scandir = candidates[best]
+            fmessage(f"Auto: {scanpat}, {scandir}")
+            if (self.no_comments.get() != True):
+                notes = [f"(Auto scan pattern '{scanpat}' '{scandir}', low resolution cycle time estimates:)"]
+                for (pat, sd), stats in zip(candidates, estimates):
+                    notes.append(f"(   {pat:<9} {sd:<12} {hms(stats.time)} )")
+                header[notes_at:notes_at] = notes
+        convert_rows, convert_cols, columns_first, waterline, spiral = \
+            self.Scan_Converters(scanpat, scandir, step, lace_bound_val, Cont_Angle)
+        if lace_bound_val != 'None' and convert_rows and convert_cols:
+            # lace bounding counts scan points, it needs one per pixel
+            adaptive = False
+        if STOCK is not None:
+            STOCK.pad_w_zeros(TOOL)
+        self.stats = MoveStats(max_rates, max_accels, tolerance)
         self.gcode = []
+        compact = None
+        if self.compact.get() and not isinstance(target, ToolpathRecorder):
+            # a toolpath keeps the plain lines, it can be compacted when written out
+            compact = target = CompactGcode(target or self.gcode.append)
         MAT.pad_w_zeros(TOOL)
         START_TIME=time()
-        self.gcode = convert(self,          \
+        self.gcode += convert(self,          \
                              MAT,           \
                              units,         \
                              TOOL,          \
@@ -856,7 +964,111 @@ class Application(Frame):
                              header,        \
                              postscript,    \
                              edge_offset,   \
-                             disable_arcs)
+                             disable_arcs,  \
+                             adaptive,      \
+                             processes,     \
+                             window,        \
+                             clearance,     \
+                             link_dist,     \
+                             order_time,    \
+                             STOCK,         \
+                             scallop_slope, \
+                             feed_max,      \
+                             rest_min,      \
+                             waterline,     \
+                             self.stats,    \
+                             spiral,        \
+                             target=target)
+        fmessage(self.stats.report(self.units.get()))
+        if compact is not None:
+            fmessage(compact.report())
+
+    def Make_Tool(self, pixel_size):
+        ''' the finishing tool shape '''
+        tool_diameter = float(self.dia.get())
+        if self.tool.get() == 'Flat':
+            return make_tool_shape(endmill, tool_diameter, pixel_size)
+        elif self.tool.get() == 'V':
+            v_angle = float(self.v_angle.get())
+            return make_tool_shape(vee_common(v_angle), tool_diameter, pixel_size)
+        else: #'Ball'
+            return make_tool_shape(ball_tool, tool_diameter, pixel_size)
+
+    def Scan_Converters(self, scanpat, scandir, step, lace_bound_val, Cont_Angle):
+        ''' the row and column scan converters for a scan pattern and cut
+            direction, with which goes first and the waterline and spiral
+            settings '''
+        waterline = 0
+        if scanpat == 'Waterline':
+            waterline = 1
+        spiral = 0
+        if scanpat == 'Spiral':
+            spiral = 1
+        rows = 0
+        columns = 0
+        columns_first = 0
+        if scanpat not in ('Columns', 'Waterline', 'Spiral'):
+            rows = 1
+        if scanpat not in ('Rows', 'Waterline', 'Spiral'):
+            columns = 1
+        if scanpat == 'C then R':
+            columns_first = 1
+        if scandir == 'Positive':
+            conv_index = 0
+            #fmessage('Positive')
+        elif scandir == 'Negative':
+            conv_index = 1
+            #fmessage('Negative')
+        elif scandir == 'Alternating':
+            conv_index = 2
+            #fmessage('Alternating')
+        elif scandir == 'Up Mill':
+            conv_index = 3
+            #fmessage('Up Milling')
+        elif scandir == 'Down Mill':
+            conv_index = 4
+            #fmessage('Down Mill')
+        else:
+            conv_index = 2
+            fmessage('Converter Error: Setting to, Alternating')
+        if waterline and conv_index == 3:
+            # Up Mill runs the waterline loops the other way round
+            waterline = 2
+        if spiral and conv_index == 3:
+            spiral = 2
+        if rows: convert_rows = convert_makers[conv_index]()
+        else: convert_rows = None
+        if columns: convert_cols = convert_makers[conv_index]()
+        else: convert_cols = None
+        if lace_bound_val != 'None' and rows and columns:
+            slope = tan( Cont_Angle*pi/180 )
+            if columns_first:
+                convert_rows = Reduce_Scan_Lace(convert_rows, slope, step+1)
+            else:
+                convert_cols = Reduce_Scan_Lace(convert_cols, slope, step+1)
+            if lace_bound_val == 'Full':
+                if columns_first:
+                    convert_cols = Reduce_Scan_Lace(convert_cols, slope, step+1)
+                else:
+                    convert_rows = Reduce_Scan_Lace(convert_rows, slope, step+1)
+        if self.cuttop.get() != True:
+            toptol = float(self.toptol.get())
+            if rows == 1:
+                convert_rows = Reduce_Scan_Lace_new(convert_rows, toptol, 1)
+            if columns == 1:
+                convert_cols = Reduce_Scan_Lace_new(convert_cols, toptol, 1)
+        return convert_rows, convert_cols, columns_first, waterline, spiral
+
+    def Make_Rough_Tool(self, pixel_size, rough_offset):
+        ''' the roughing tool shape grown by 'rough_offset' '''
+        tool_diameter = float(self.ROUGH_DIA.get())
+        if self.ROUGH_TOOL.get() == 'Flat':
+            return make_tool_shape(endmill, tool_diameter, pixel_size, rough_offset)
+        elif self.ROUGH_TOOL.get() == 'V':
+            v_angle = float(self.ROUGH_V_ANGLE.get())
+            return make_tool_shape(vee_common(v_angle), tool_diameter, pixel_size, rough_offset)
+        else: #'Ball'
+            return make_tool_shape(ball_tool, tool_diameter, pixel_size, rough_offset)
 
     def CopyClipboard_GCode(self):
         self.clipboard_clear()
@@ -1153,6 +1365,19 @@ class Application(Frame):
     def Entry_Tolerance_Callback(self, varName, index, mode):
         self.entry_set(self.Entry_Tolerance,self.Entry_Tolerance_Check(), new=1)
 
+    def Entry_RampAngle_Check(self):
+        try:
+            value = float(self.ramp_angle.get())
+            if  value <= 0.0 or value >= 90:
+                self.statusMessage.set(' Ramp angle should be between 0 and 90 ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_RampAngle_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_RampAngle,self.Entry_RampAngle_Check(), new=1)
+
     def Entry_ContAngle_Check(self):
         try:
             value = float(self.cangle.get())
@@ -1166,6 +1391,136 @@ class Application(Frame):
     def Entry_ContAngle_Callback(self, varName, index, mode):
         self.entry_set(self.Entry_ContAngle,self.Entry_ContAngle_Check(), new=1)
 
+    def Entry_Processes_Check(self):
+        try:
+            value = int(self.processes.get())
+            if  value < 1:
+                self.statusMessage.set(' Worker processes should be 1 or more ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_Processes_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_Processes,self.Entry_Processes_Check(), new=1)
+
+    def Entry_Window_Check(self):
+        try:
+            value = int(self.window.get())
+            if  value != 0 and value < 3:
+                self.statusMessage.set(' Simplify window should be 0 or at least 3 points ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_Window_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_Window,self.Entry_Window_Check(), new=1)
+
+    def Entry_Clearance_Check(self):
+        try:
+            value = float(self.clearance.get())
+            if  value < 0.0:
+                self.statusMessage.set(' Retract clearance should be 0 or greater ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_Clearance_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_Clearance,self.Entry_Clearance_Check(), new=1)
+
+    def Entry_LinkDist_Check(self):
+        try:
+            value = float(self.link_dist.get())
+            if  value < 0.0:
+                self.statusMessage.set(' Stay-down link distance should be 0 or greater ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_LinkDist_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_LinkDist,self.Entry_LinkDist_Check(), new=1)
+
+    def Entry_OrderTime_Check(self):
+        try:
+            value = float(self.order_time.get())
+            if  value < 0.0:
+                self.statusMessage.set(' Span ordering time should be 0 or greater ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_OrderTime_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_OrderTime,self.Entry_OrderTime_Check(), new=1)
+
+    def Entry_Scallop_Check(self):
+        try:
+            value = float(self.scallop.get())
+            if  value < 0.0:
+                self.statusMessage.set(' Scallop height should be 0 or greater ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_Scallop_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_Scallop,self.Entry_Scallop_Check(), new=1)
+
+    def Entry_FeedMax_Check(self):
+        try:
+            value = float(self.feed_max.get())
+            if  value < 100.0:
+                self.statusMessage.set(' Max feed rate should be 100% or more ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_FeedMax_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_FeedMax,self.Entry_FeedMax_Check(), new=1)
+
+    def Entry_RestMin_Check(self):
+        try:
+            value = float(self.rest_min.get())
+            if  value < 0.0:
+                self.statusMessage.set(' Rest machining threshold should be 0 or greater ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_RestMin_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_RestMin,self.Entry_RestMin_Check(), new=1)
+
+    def Entry_MaxRates_Check(self):
+        try:
+            values = [float(v) for v in self.max_rates.get().split('|')]
+            if  len(values) != 3 or min(values) <= 0.0:
+                self.statusMessage.set(' Max rates should be three rates greater than 0, X|Y|Z ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_MaxRates_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_MaxRates,self.Entry_MaxRates_Check(), new=1)
+
+    def Entry_MaxAccels_Check(self):
+        try:
+            values = [float(v) for v in self.max_accels.get().split('|')]
+            if  len(values) != 3 or min(values) <= 0.0:
+                self.statusMessage.set(' Accelerations should be three values greater than 0, X|Y|Z ')
+                return 2 # Value is invalid number
+        except:
+            return 3     # Value not a number
+        return 0         # Value is a valid number
+
+    def Entry_MaxAccels_Callback(self, varName, index, mode):
+        self.entry_set(self.Entry_MaxAccels,self.Entry_MaxAccels_Check(), new=1)
+
     '''##########################
     #                           #
     ##########################'''
@@ -1182,7 +1537,18 @@ class Application(Frame):
         self.entry_set(self.Entry_Zcut, self.Entry_Zcut_Check(), 2)
         GEN_error_cnt= \
         self.entry_set(self.Entry_Tolerance, self.Entry_Tolerance_Check(), 2) +\
-        self.entry_set(self.Entry_ContAngle, self.Entry_ContAngle_Check(), 2)
+        self.entry_set(self.Entry_ContAngle, self.Entry_ContAngle_Check(), 2) +\
+        self.entry_set(self.Entry_RampAngle, self.Entry_RampAngle_Check(), 2) +\
+        self.entry_set(self.Entry_Processes, self.Entry_Processes_Check(), 2) +\
+        self.entry_set(self.Entry_Window, self.Entry_Window_Check(), 2) +\
+        self.entry_set(self.Entry_Clearance, self.Entry_Clearance_Check(), 2) +\
+        self.entry_set(self.Entry_LinkDist, self.Entry_LinkDist_Check(), 2) +\
+        self.entry_set(self.Entry_OrderTime, self.Entry_OrderTime_Check(), 2) +\
+        self.entry_set(self.Entry_Scallop, self.Entry_Scallop_Check(), 2) +\
+        self.entry_set(self.Entry_FeedMax, self.Entry_FeedMax_Check(), 2) +\
+        self.entry_set(self.Entry_RestMin, self.Entry_RestMin_Check(), 2) +\
+        self.entry_set(self.Entry_MaxRates, self.Entry_MaxRates_Check(), 2) +\
+        self.entry_set(self.Entry_MaxAccels, self.Entry_MaxAccels_Check(), 2)
         ROUGH_error_cnt= \
         self.entry_set(self.ROUGH_Entry_ToolDIA, self.ROUGH_Entry_ToolDIA_Check(), 2) +\
         self.entry_set(self.ROUGH_Entry_Vangle, self.ROUGH_Entry_Vangle_Check(), 2) +\
@@ -1209,9 +1575,11 @@ class Application(Frame):
         if (self.units.get() == 'in') and (self.funits.get()=='mm/min'):
             self.Scale_Linear_Inputs(1/25.4)
             self.funits.set('in/min')
+            self.aunits.set('in/s^2')
         elif (self.units.get() == 'mm') and (self.funits.get()=='in/min'):
             self.Scale_Linear_Inputs(25.4)
             self.funits.set('mm/min')
+            self.aunits.set('mm/s^2')
 
     def Scale_Linear_Inputs(self, factor=1.0):
         try:
@@ -1230,6 +1598,12 @@ class Application(Frame):
             self.ROUGH_OFFSET.set(  f"{float(self.ROUGH_OFFSET.get()  ) * factor:.3g}")
             self.ROUGH_DIA.set(     f"{float(self.ROUGH_DIA.get()     ) * factor:.3g}")
             self.tolerance.set(     f"{float(self.tolerance.get()     ) * factor:.3g}")
+            self.clearance.set(     f"{float(self.clearance.get()     ) * factor:.3g}")
+            self.link_dist.set(     f"{float(self.link_dist.get()     ) * factor:.3g}")
+            self.scallop.set(       f"{float(self.scallop.get()       ) * factor:.3g}")
+            self.rest_min.set(      f"{float(self.rest_min.get()      ) * factor:.3g}")
+            self.max_rates.set(     '|'.join(f"{float(v) * factor:.6g}" for v in self.max_rates.get().split('|')))
+            self.max_accels.set(    '|'.join(f"{float(v) * factor:.6g}" for v in self.max_accels.get().split('|')))
         except:
             pass
 
@@ -1260,6 +1634,27 @@ class Application(Frame):
             self.Read_image_file(fileselect)
             self.Plot_Data()
 
+    def menu_File_Open_STOCK_File(self):
+        init_dir = os.path.dirname(self.STOCK_FILE)
+        if ( not os.path.isdir(init_dir) ):
+            init_dir = os.path.dirname(self.IMAGE_FILE)
+        if ( not os.path.isdir(init_dir) ):
+            init_dir = self.HOME_DIR
+        if PIL:
+            filetypes = [('Stock Map Files', ('*.pgm','*.jpg','*.png','*.gif','*.npy')), ('All Files','*')]
+        else:
+            filetypes = [('Stock Map Files', ('*.pgm','*.gif','*.npy')), ('All Files','*.*')]
+        fileselect = askopenfilename(filetypes=filetypes, initialdir=init_dir)
+        if fileselect != '' and fileselect != ():
+            self.STOCK_FILE = fileselect
+            self.statusMessage.set(f"Stock map file: {fileselect}")
+            self.statusbar.configure( bg = 'white' )
+
+    def menu_File_Clear_STOCK_File(self):
+        self.STOCK_FILE = (os.path.join(self.HOME_DIR, 'None'))
+        self.statusMessage.set('Stock map cleared, roughing starts from flat stock')
+        self.statusbar.configure( bg = 'white' )
+
     def Open_G_Code_File(self,filename):
         try:
             fin = open(filename,'r')
@@ -1285,6 +1680,12 @@ class Application(Frame):
                     self.disable_arcs.set(line[line.find('disable_arcs'):].split()[1])
                 elif 'no_comments'   in line:
                     self.no_comments.set(line[line.find('no_comments'):].split()[1])
+                elif 'compact'   in line:
+                    self.compact.set(line[line.find('compact'):].split()[1])
+                elif 'adaptive'   in line:
+                    self.adaptive.set(line[line.find('adaptive'):].split()[1])
+                elif 'scallop_slope'   in line:
+                    self.scallop_slope.set(line[line.find('scallop_slope'):].split()[1])
                 # STRING.set()
                 elif 'yscale'     in line:
                     self.yscale.set(line[line.find('yscale'):].split()[1])
@@ -1310,6 +1711,10 @@ class Application(Frame):
                     self.units.set(line[line.find('units'):].split()[1])
                 elif 'plunge'    in line:
                     self.plungetype.set(line[line.find('plunge'):].split()[1])
+                elif 'ramp_angle'    in line:
+                     self.ramp_angle.set(line[line.find('ramp_angle'):].split()[1])
+                elif 'feed_max'    in line:
+                     self.feed_max.set(line[line.find('feed_max'):].split()[1])
                 elif 'feed'    in line:
                      self.f_feed.set(line[line.find('feed'):].split()[1])
                 elif 'lace'    in line:
@@ -1320,6 +1725,24 @@ class Application(Frame):
                      self.tolerance.set(line[line.find('tolerance'):].split()[1])
                 elif 'splitstep'    in line:
                      self.splitstep.set(line[line.find('splitstep'):].split()[1])
+                elif 'processes'    in line:
+                     self.processes.set(line[line.find('processes'):].split()[1])
+                elif 'window'    in line:
+                     self.window.set(line[line.find('window'):].split()[1])
+                elif 'clearance'    in line:
+                     self.clearance.set(line[line.find('clearance'):].split()[1])
+                elif 'link_dist'    in line:
+                     self.link_dist.set(line[line.find('link_dist'):].split()[1])
+                elif 'order_time'    in line:
+                     self.order_time.set(line[line.find('order_time'):].split()[1])
+                elif 'scallop'    in line:
+                     self.scallop.set(line[line.find('scallop'):].split()[1])
+                elif 'rest_min'    in line:
+                     self.rest_min.set(line[line.find('rest_min'):].split()[1])
+                elif 'max_rates'    in line:
+                     self.max_rates.set(line[line.find('max_rates'):].split()[1])
+                elif 'max_accels'    in line:
+                     self.max_accels.set(line[line.find('max_accels'):].split()[1])
                 elif 'scanpat'    in line:
                      self.scanpat.set(line[line.find('scanpat'):].split('\'')[1])
                 elif 'scandir'    in line:
@@ -1330,6 +1753,8 @@ class Application(Frame):
                      self.gpost.set(line[line.find('gpost'):].split('\'')[1])
                 elif 'imagefile'    in line:
                        self.IMAGE_FILE=(line[line.find('imagefile'):].split('\'')[1])
+                elif 'stockfile'    in line:
+                       self.STOCK_FILE=(line[line.find('stockfile'):].split('\'')[1])
                 elif 'ROUGH_TOOL'    in line:
                      self.ROUGH_TOOL.set(line[line.find('ROUGH_TOOL'):].split()[1])
                 elif 'ROUGH_DIA'    in line:
@@ -1412,6 +1837,47 @@ class Application(Frame):
                 self.statusMessage.set(f"Unable to Open Image file: {fileselect}")
                 self.statusbar.configure( bg = 'red' )
 
+    '''################################################################################
+    # Read the stock map in STOCK_FILE as a matrix of Z heights the same size as the  #
+    # image, or None with a message when that fails.  A .npy file holds the heights   #
+    # themselves, rows first like the image.  An image is scaled like the depth       #
+    # image, white is the top of the stock and black is 'depth' below it.             #
+    ################################################################################'''
+    def Read_stock_file(self, wim, him, depth):
+        fileselect = self.STOCK_FILE
+        fileName, fileExt = os.path.splitext(fileselect)
+        STOCK = Image_Matrix()
+        try:
+            if fileExt.lower() == '.npy':
+                if not NUMPY:
+                    raise ValueError('NumPy is needed to read .npy stock maps')
+                STOCK.From_Array(numpy.load(fileselect))
+            else:
+                if PIL:
+                    PIL_im = Image.open(fileselect)
+                    if PIL_im.mode == 'I' or PIL_im.mode == 'F' :
+                        PIL_im = PIL_im.convert('F')
+                        PIL_im = PIL_im.point(lambda x : x * (1.0 / 256.0))
+                    else:
+                        PIL_im = PIL_im.convert('L')
+                    STOCK.FromImage(PIL_im, True)
+                else:
+                    STOCK.FromImage(PhotoImage(file=fileselect), False)
+                STOCK.mult(depth/255.0)
+                if self.invert.get():
+                    STOCK.mult(-1.0)
+                else:
+                    STOCK.minus(depth)
+        except Exception as err:
+            self.statusMessage.set(f"Unable to Open Stock Map file: {fileselect} ({err})")
+            self.statusbar.configure( bg = 'red' )
+            return None
+        if STOCK.shape[0] != wim or STOCK.shape[1] != him:
+            self.statusMessage.set(f"Stock map is {STOCK.shape[1]}x{STOCK.shape[0]}, the image is {him}x{wim}")
+            self.statusbar.configure( bg = 'red' )
+            return None
+        return STOCK
+
     def convert_I_to_L(self,img):
         array = numpy.uint8(numpy.array(img)/256.0)
         return Image.fromarray(array)
@@ -1436,11 +1902,18 @@ class Application(Frame):
         except:
             pass
 
-    def menu_File_Save_G_Code_File(self,rough_flag = 0):
+    def menu_File_Save_Toolpath_File(self):
+        self.menu_File_Save_G_Code_File(rough_flag = 0, toolpath = True)
+
+    def menu_File_Save_G_Code_File(self,rough_flag = 0, toolpath = False):
         global STOP_CALC
         STOP_CALC = False
         if (self.Check_All_Variables() > 0):
             return
+        if toolpath and not NUMPY:
+            self.statusMessage.set('NumPy is needed to save toolpath files')
+            self.statusbar.configure( bg = 'red' )
+            return
         init_dir = os.path.dirname(self.NGC_FILE)
         if ( not os.path.isdir(init_dir) ):
             init_dir = self.HOME_DIR
@@ -1451,18 +1924,33 @@ class Application(Frame):
         init_file = init_file.replace('_rough', '')
         if rough_flag == 1:
             init_file = init_file + '_rough'
-        filename = asksaveasfilename(defaultextension='.ngc', \
-                                     filetypes=[('G-Code Files','*.ngc'),('TAP File','*.tap'),('All Files','*')],\
-                                     initialdir=init_dir,\
-                                     initialfile= init_file )
+        if toolpath:
+            filename = asksaveasfilename(defaultextension='.npz', \
+                                         filetypes=[('Toolpath Files','*.npz'),('All Files','*')],\
+                                         initialdir=init_dir,\
+                                         initialfile= init_file )
+        else:
+            filename = asksaveasfilename(defaultextension='.ngc', \
+                                         filetypes=[('G-Code Files','*.ngc'),('TAP File','*.tap'),('All Files','*')],\
+                                         initialdir=init_dir,\
+                                         initialfile= init_file )
         if filename != '' and filename != ():
-            self.NGC_FILE = filename
+            if not toolpath:
+                self.NGC_FILE = filename
             try:
-                fout = open(filename,'w')
+                if toolpath:
+                    fout = open(filename,'wb')
+                else:
+                    fout = open(filename,'w', errors='replace')
             except:
                 self.statusMessage.set(f"Unable to open file for writing: {filename}")
                 self.statusbar.configure( bg = 'red' )
                 return
+            if toolpath:
+                # kept in memory and saved when it is done
+                target = ToolpathRecorder()
+            else:
+                target = GcodeFile(fout)
             vcalc_status = Toplevel(width=525, height=50)
             # Use grab_set to prevent user input in the main window during calculations
             vcalc_status.grab_set()
@@ -1478,16 +1966,13 @@ class Application(Frame):
             vcalc_status.title('Saving File')
             vcalc_status.iconname('dmap2gcode')
             vcalc_status.update_idletasks()
-            self.WriteGCode(rough_flag = rough_flag)
-            for line in self.gcode:
-                try:
-                    fout.write(line+'\n')
-                except:
-                    fmessage('skipping g-code line:' + line + '; may be due to non ASCII character.');
-                    pass
-            fout.close
+            # the G-code goes straight to the file as it is made
+            self.WriteGCode(rough_flag = rough_flag, target=target)
+            if toolpath and not STOP_CALC:
+                target.save(fout)
+            fout.close()
             if not STOP_CALC:
-                self.statusMessage.set(f"File Saved: {filename}")
+                self.statusMessage.set(f"File Saved: {filename}, Cycle Time {hms(self.stats.time)}")
                 self.statusbar.configure( bg = 'white' )
             else:
                 self.statusMessage.set('File Save Terminated')
@@ -1498,6 +1983,46 @@ class Application(Frame):
             except:
                 pass
 
+    def menu_File_Toolpath_G_Code_File(self):
+        if not NUMPY:
+            self.statusMessage.set('NumPy is needed to read toolpath files')
+            self.statusbar.configure( bg = 'red' )
+            return
+        init_dir = os.path.dirname(self.NGC_FILE)
+        if ( not os.path.isdir(init_dir) ):
+            init_dir = self.HOME_DIR
+        fileselect = askopenfilename(filetypes=[('Toolpath Files','*.npz'),('All Files','*')],\
+                                     initialdir=init_dir)
+        if fileselect == '' or fileselect == ():
+            return
+        init_file = os.path.basename(os.path.splitext(fileselect)[0])
+        filename = asksaveasfilename(defaultextension='.ngc', \
+                                     filetypes=[('G-Code Files','*.ngc'),('TAP File','*.tap'),('All Files','*')],\
+                                     initialdir=init_dir,\
+                                     initialfile= init_file )
+        if filename == '' or filename == ():
+            return
+        self.NGC_FILE = filename
+        try:
+            fout = open(filename,'w', errors='replace')
+        except:
+            self.statusMessage.set(f"Unable to open file for writing: {filename}")
+            self.statusbar.configure( bg = 'red' )
+            return
+        target = GcodeFile(fout)
+        if self.compact.get():
+            target = CompactGcode(target)
+        try:
+            toolpath_gcode(fileselect, target)
+        except:
+            fout.close()
+            self.statusMessage.set(f"Unable to read toolpath file: {fileselect}")
+            self.statusbar.configure( bg = 'red' )
+            return
+        fout.close()
+        self.statusMessage.set(f"File Saved: {filename}")
+        self.statusbar.configure( bg = 'white' )
+
     def menu_File_Quit(self):
         if message_ask_ok_cancel('Exit', 'Exiting....'):
             self.Quit_Click(None)
@@ -1755,8 +2280,8 @@ class Application(Frame):
         else:
             self.Label_ContAngle.configure(state='normal')
             self.Entry_ContAngle.configure(state='normal')
-        if (self.scanpat.get().find('R') == -1) or \
-           (self.scanpat.get().find('C') == -1):
+        if ((self.scanpat.get().find('R') == -1) or \
+            (self.scanpat.get().find('C') == -1)) and self.scanpat.get() != 'Auto':
             self.Label_LaceBound.configure(state='disabled')
             self.LaceBound_OptionMenu.configure(state='disabled')
             self.Label_ContAngle.configure(state='disabled')
@@ -1764,6 +2289,12 @@ class Application(Frame):
         else:
             self.Label_LaceBound.configure(state='normal')
             self.LaceBound_OptionMenu.configure(state='normal')
+        if self.plungetype.get() == 'ramp':
+            self.Label_RampAngle.configure(state='normal')
+            self.Entry_RampAngle.configure(state='normal')
+        else:
+            self.Label_RampAngle.configure(state='disabled')
+            self.Entry_RampAngle.configure(state='disabled')
 
     def Set_Input_States_GEN_Event(self,event):
         self.Set_Input_States_GEN()
@@ -1868,7 +2399,7 @@ class Application(Frame):
     #            general settings window             #
     ###############################################'''
     def GEN_Settings_Window(self):
-        self.gen_settings = Toplevel(width=560, height=360)
+        self.gen_settings = Toplevel(width=560, height=696)
         self.gen_settings.resizable(0,0)
         self.gen_settings.title('Settings')
         self.gen_settings.iconname('Settings')
@@ -1947,12 +2478,28 @@ class Application(Frame):
         D_Yloc=D_Yloc+D_dY
         self.Label_PlungeType = Label(self.gen_settings,text='Plunge Type', anchor=E)
         self.Label_PlungeType.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
-        self.Radio_PlungeType_S = Radiobutton(self.gen_settings,text='Vertical', value='simple', width='100', anchor=W)
+        self.Radio_PlungeType_S = Radiobutton(self.gen_settings,text='Vertical', value='simple', width='100', anchor=W,
+                                              command=self.Set_Input_States_GEN)
         self.Radio_PlungeType_S.place(x=xd_entry_L, y=D_Yloc, width=w_radio, height=23)
         self.Radio_PlungeType_S.configure(variable=self.plungetype )
-        self.Radio_PlungeType_A = Radiobutton(self.gen_settings,text='Arc', value='arc', width='100', anchor=W)
+        self.Radio_PlungeType_A = Radiobutton(self.gen_settings,text='Arc', value='arc', width='100', anchor=W,
+                                              command=self.Set_Input_States_GEN)
         self.Radio_PlungeType_A.place(x=xd_radio2, y=D_Yloc, width=w_radio, height=23)
         self.Radio_PlungeType_A.configure(variable=self.plungetype )
+        self.Radio_PlungeType_R = Radiobutton(self.gen_settings,text='Ramp', value='ramp', width='100', anchor=W,
+                                              command=self.Set_Input_States_GEN)
+        self.Radio_PlungeType_R.place(x=xd_radio3, y=D_Yloc, width=w_radio, height=23)
+        self.Radio_PlungeType_R.configure(variable=self.plungetype )
+        D_Yloc=D_Yloc+D_dY
+        self.Label_RampAngle = Label(self.gen_settings,text='Ramp Angle', anchor=E)
+        self.Label_RampAngle.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_RampAngle_u = Label(self.gen_settings,text='deg', anchor=W)
+        self.Label_RampAngle_u.place(x=xd_units_L, y=D_Yloc, width=w_units, height=21)
+        self.Entry_RampAngle = Entry(self.gen_settings,width='15')
+        self.Entry_RampAngle.place(x=xd_entry_L, y=D_Yloc, width=w_entry, height=23)
+        self.Entry_RampAngle.configure(textvariable=self.ramp_angle)
+        self.ramp_angle.trace_variable('w', self.Entry_RampAngle_Callback)
+        self.entry_set(self.Entry_RampAngle,self.Entry_RampAngle_Check(),2)
         D_Yloc=D_Yloc+D_dY
         self.Label_Disable_Arcs = Label(self.gen_settings,text='Disable G-Code Arcs', anchor=E)
         self.Label_Disable_Arcs.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
@@ -1965,6 +2512,122 @@ class Application(Frame):
         self.Checkbutton_no_com = Checkbutton(self.gen_settings,text='', anchor=W)
         self.Checkbutton_no_com.place(x=xd_entry_L, y=D_Yloc, width=w_radio, height=23)
         self.Checkbutton_no_com.configure(variable=self.no_comments)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_Compact = Label(self.gen_settings,text='Compact Output', anchor=E)
+        self.Label_Compact.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Checkbutton_Compact = Checkbutton(self.gen_settings,text='', anchor=W)
+        self.Checkbutton_Compact.place(x=xd_entry_L, y=D_Yloc, width=w_radio, height=23)
+        self.Checkbutton_Compact.configure(variable=self.compact)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_Adaptive = Label(self.gen_settings,text='Adaptive Sampling', anchor=E)
+        self.Label_Adaptive.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Checkbutton_Adaptive = Checkbutton(self.gen_settings,text='', anchor=W)
+        self.Checkbutton_Adaptive.place(x=xd_entry_L, y=D_Yloc, width=w_radio, height=23)
+        self.Checkbutton_Adaptive.configure(variable=self.adaptive)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_Processes = Label(self.gen_settings,text='Worker Processes', anchor=E)
+        self.Label_Processes.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Entry_Processes = Entry(self.gen_settings,width='15')
+        self.Entry_Processes.place(x=xd_entry_L, y=D_Yloc, width=w_entry, height=23)
+        self.Entry_Processes.configure(textvariable=self.processes)
+        self.processes.trace_variable('w', self.Entry_Processes_Callback)
+        self.entry_set(self.Entry_Processes,self.Entry_Processes_Check(),2)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_Window = Label(self.gen_settings,text='Simplify Window', anchor=E)
+        self.Label_Window.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_Window_u = Label(self.gen_settings,text='points', anchor=W)
+        self.Label_Window_u.place(x=xd_units_L, y=D_Yloc, width=w_units+10, height=21)
+        self.Entry_Window = Entry(self.gen_settings,width='15')
+        self.Entry_Window.place(x=xd_entry_L, y=D_Yloc, width=w_entry, height=23)
+        self.Entry_Window.configure(textvariable=self.window)
+        self.window.trace_variable('w', self.Entry_Window_Callback)
+        self.entry_set(self.Entry_Window,self.Entry_Window_Check(),2)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_Clearance = Label(self.gen_settings,text='Retract Clearance', anchor=E)
+        self.Label_Clearance.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_Clearance_u = Label(self.gen_settings,textvariable=self.units, anchor=W)
+        self.Label_Clearance_u.place(x=xd_units_L, y=D_Yloc, width=w_units, height=21)
+        self.Entry_Clearance = Entry(self.gen_settings,width='15')
+        self.Entry_Clearance.place(x=xd_entry_L, y=D_Yloc, width=w_entry, height=23)
+        self.Entry_Clearance.configure(textvariable=self.clearance)
+        self.clearance.trace_variable('w', self.Entry_Clearance_Callback)
+        self.entry_set(self.Entry_Clearance,self.Entry_Clearance_Check(),2)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_LinkDist = Label(self.gen_settings,text='Stay-Down Link', anchor=E)
+        self.Label_LinkDist.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_LinkDist_u = Label(self.gen_settings,textvariable=self.units, anchor=W)
+        self.Label_LinkDist_u.place(x=xd_units_L, y=D_Yloc, width=w_units, height=21)
+        self.Entry_LinkDist = Entry(self.gen_settings,width='15')
+        self.Entry_LinkDist.place(x=xd_entry_L, y=D_Yloc, width=w_entry, height=23)
+        self.Entry_LinkDist.configure(textvariable=self.link_dist)
+        self.link_dist.trace_variable('w', self.Entry_LinkDist_Callback)
+        self.entry_set(self.Entry_LinkDist,self.Entry_LinkDist_Check(),2)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_OrderTime = Label(self.gen_settings,text='Span Ordering Time', anchor=E)
+        self.Label_OrderTime.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_OrderTime_u = Label(self.gen_settings,text='sec', anchor=W)
+        self.Label_OrderTime_u.place(x=xd_units_L, y=D_Yloc, width=w_units, height=21)
+        self.Entry_OrderTime = Entry(self.gen_settings,width='15')
+        self.Entry_OrderTime.place(x=xd_entry_L, y=D_Yloc, width=w_entry, height=23)
+        self.Entry_OrderTime.configure(textvariable=self.order_time)
+        self.order_time.trace_variable('w', self.Entry_OrderTime_Callback)
+        self.entry_set(self.Entry_OrderTime,self.Entry_OrderTime_Check(),2)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_Scallop = Label(self.gen_settings,text='Scallop Height', anchor=E)
+        self.Label_Scallop.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_Scallop_u = Label(self.gen_settings,textvariable=self.units, anchor=W)
+        self.Label_Scallop_u.place(x=xd_units_L, y=D_Yloc, width=w_units, height=21)
+        self.Entry_Scallop = Entry(self.gen_settings,width='15')
+        self.Entry_Scallop.place(x=xd_entry_L, y=D_Yloc, width=w_entry, height=23)
+        self.Entry_Scallop.configure(textvariable=self.scallop)
+        self.scallop.trace_variable('w', self.Entry_Scallop_Callback)
+        self.entry_set(self.Entry_Scallop,self.Entry_Scallop_Check(),2)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_ScallopSlope = Label(self.gen_settings,text='Scallop by Slope', anchor=E)
+        self.Label_ScallopSlope.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Checkbutton_ScallopSlope = Checkbutton(self.gen_settings,text='', anchor=W)
+        self.Checkbutton_ScallopSlope.place(x=xd_entry_L, y=D_Yloc, width=w_radio, height=23)
+        self.Checkbutton_ScallopSlope.configure(variable=self.scallop_slope)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_FeedMax = Label(self.gen_settings,text='Max Feed Rate', anchor=E)
+        self.Label_FeedMax.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_FeedMax_u = Label(self.gen_settings,text='%', anchor=W)
+        self.Label_FeedMax_u.place(x=xd_units_L, y=D_Yloc, width=w_units, height=21)
+        self.Entry_FeedMax = Entry(self.gen_settings,width='15')
+        self.Entry_FeedMax.place(x=xd_entry_L, y=D_Yloc, width=w_entry, height=23)
+        self.Entry_FeedMax.configure(textvariable=self.feed_max)
+        self.feed_max.trace_variable('w', self.Entry_FeedMax_Callback)
+        self.entry_set(self.Entry_FeedMax,self.Entry_FeedMax_Check(),2)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_RestMin = Label(self.gen_settings,text='Rest Machining', anchor=E)
+        self.Label_RestMin.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_RestMin_u = Label(self.gen_settings,textvariable=self.units, anchor=W)
+        self.Label_RestMin_u.place(x=xd_units_L, y=D_Yloc, width=w_units, height=21)
+        self.Entry_RestMin = Entry(self.gen_settings,width='15')
+        self.Entry_RestMin.place(x=xd_entry_L, y=D_Yloc, width=w_entry, height=23)
+        self.Entry_RestMin.configure(textvariable=self.rest_min)
+        self.rest_min.trace_variable('w', self.Entry_RestMin_Callback)
+        self.entry_set(self.Entry_RestMin,self.Entry_RestMin_Check(),2)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_MaxRates = Label(self.gen_settings,text='Max Rates X|Y|Z', anchor=E)
+        self.Label_MaxRates.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_MaxRates_u = Label(self.gen_settings,textvariable=self.funits, anchor=W)
+        self.Label_MaxRates_u.place(x=xd_units_L+40, y=D_Yloc, width=w_units+20, height=21)
+        self.Entry_MaxRates = Entry(self.gen_settings,width='15')
+        self.Entry_MaxRates.place(x=xd_entry_L, y=D_Yloc, width=w_entry+40, height=23)
+        self.Entry_MaxRates.configure(textvariable=self.max_rates)
+        self.max_rates.trace_variable('w', self.Entry_MaxRates_Callback)
+        self.entry_set(self.Entry_MaxRates,self.Entry_MaxRates_Check(),2)
+        D_Yloc=D_Yloc+D_dY
+        self.Label_MaxAccels = Label(self.gen_settings,text='Accelerations X|Y|Z', anchor=E)
+        self.Label_MaxAccels.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
+        self.Label_MaxAccels_u = Label(self.gen_settings,textvariable=self.aunits, anchor=W)
+        self.Label_MaxAccels_u.place(x=xd_units_L+40, y=D_Yloc, width=w_units+20, height=21)
+        self.Entry_MaxAccels = Entry(self.gen_settings,width='15')
+        self.Entry_MaxAccels.place(x=xd_entry_L, y=D_Yloc, width=w_entry+40, height=23)
+        self.Entry_MaxAccels.configure(textvariable=self.max_accels)
+        self.max_accels.trace_variable('w', self.Entry_MaxAccels_Callback)
+        self.entry_set(self.Entry_MaxAccels,self.Entry_MaxAccels_Check(),2)
         D_Yloc=D_Yloc+D_dY+10
         self.Label_SaveConfig = Label(self.gen_settings,text='Configuration File', anchor=E)
         self.Label_SaveConfig.place(x=xd_label_L, y=D_Yloc, width=w_label, height=21)
@@ -2122,9 +2785,113 @@ def arc_fmt(plane, c1, c2, p1):
     if plane == 18: return f"I{c1-x:.4f} K{c2-z:.4f}"
     if plane == 19: return f"J{c1-y:.4f} K{c2-z:.4f}"
 
+''' Ranges shorter than this are done point by point even when NumPy is
+    available, the array overhead costs more than it saves on a few points '''
+VECTOR_MIN = 48
+
+''' dist_lseg from points a and b of the (n,3) float64 array 'pts' to every
+    point strictly between them '''
+def seg_dists(pts, a, b):
+    p0 = pts[a]
+    d = pts[b] - p0
+    d2 = d.dot(d)
+    E = pts[a+1:b] - p0
+    if d2 == 0: return numpy.zeros(len(E))
+    t = numpy.clip(E.dot(d) / d2, 0, 1)
+    E -= t[:, None] * d
+    return numpy.sqrt((E * E).sum(axis=1))
+
+'''################################################################################
+# Find the point of a..b farthest from the chord.  Also returns the indexes of    #
+# the points that set a new farthest distance while scanning from a to b, these   #
+# are the candidate middle points for an arc.  When the path is given as the      #
+# float64 array T the distances come from seg_dists, which can differ from the    #
+# scalar loop in the last bits.                                                   #
+################################################################################'''
+def douglas_worst(T, st, a, b):
+    if T is None:
+        l1 = st[a]
+        l2 = st[b]
+        worst_dist = 0
+        worst = a
+        records = []
+        for i in range(a+1, b):
+            dist = dist_lseg(l1, l2, st[i])
+            if dist > worst_dist:
+                worst = i
+                worst_dist = dist
+                records.append(i)
+        return worst, worst_dist, records
+    dists = seg_dists(T, a, b)
+    prev = numpy.maximum.accumulate(dists)
+    prev[1:] = prev[:-1]
+    prev[0] = 0
+    records = (numpy.nonzero(dists > prev)[0] + (a + 1)).tolist()
+    if not records:
+        return a, 0, records
+    return records[-1], float(dists[records[-1] - a - 1]), records
+
+plane_axes = {17: (0, 1), 18: (0, 2), 19: (1, 2)}
+
+''' The radial error of point p from the arc of radius 'rad' around (c1, c2) '''
+def arc_err(plane, c1, c2, rad, p):
+    u, v = plane_axes[plane]
+    return abs(hypot(c1-p[u], c2-p[v]) - rad)
+
+'''################################################################################
+# Fit an arc in 'plane' through points a and b and the candidate in 'records'     #
+# giving the smallest radius.  Returns the center (c1, c2), the index of the      #
+# middle point and whether the arc keeps every point of a..b within tolerance     #
+# and closer than the farthest point is to the chord.  When the path is given as  #
+# the float64 array T the radii of the candidates and the radial errors of the    #
+# points are each one vectorized expression.                                      #
+################################################################################'''
+def arc_fit(plane, T, st, a, b, records, tolerance, worst_dist):
+    if plane is None or not len(records):
+        return None, None, -1, False
+    ps = st[a]
+    pe = st[b]
+    u, v = plane_axes[plane]
+    if T is None:
+        min_rad = MAXINT
+        max_arc = -1
+        for i in records:
+            rad = arc_rad(plane, ps, st[i], pe)
+            if rad < min_rad:
+                max_arc = i
+                min_rad = rad
+        if min_rad == MAXINT:
+            return None, None, -1, False
+    else:
+        R = numpy.array(records)
+        x12 = T[a,u] - T[R,u]
+        y12 = T[a,v] - T[R,v]
+        x23 = T[R,u] - T[b,u]
+        y23 = T[R,v] - T[b,v]
+        den = abs(x12 * y23 - x23 * y12)
+        flat = den < 1e-5
+        if flat.all():
+            return None, None, -1, False
+        h = numpy.hypot(x12, y12) * numpy.hypot(x23, y23) * hypot(T[b,u] - T[a,u], T[b,v] - T[a,v])
+        rad = numpy.where(flat, numpy.inf, h / 2 / numpy.where(flat, 1.0, den))
+        k = int(rad.argmin())
+        max_arc = records[k]
+        min_rad = float(rad[k])
+    c1, c2 = arc_center(plane, ps, st[max_arc], pe)
+    if not one_quadrant(plane, (c1, c2), ps, st[max_arc], pe):
+        return c1, c2, max_arc, False
+    if T is None:
+        worst_arc_dist = 0
+        for i in range(a, b+1):
+            dist = arc_err(plane, c1, c2, min_rad, st[i])
+            if dist > worst_arc_dist: worst_arc_dist = dist
+    else:
+        worst_arc_dist = float(abs(numpy.hypot(c1 - T[a:b+1,u], c2 - T[a:b+1,v]) - min_rad).max())
+    return c1, c2, max_arc, worst_arc_dist < tolerance and worst_arc_dist < worst_dist
+
 '''################################################################################
 # Perform Douglas-Peucker simplification on the path 'st' with the specified      #
-# tolerance.  The '_first' argument is for internal use only.                     #
+# tolerance.                                                                      #
 #                                                                                 #
 # The Douglas-Peucker simplification algorithm finds a subset of the input points #
 # whose path is never more than 'tolerance' away from the original input path.    #
@@ -2133,90 +2900,523 @@ def arc_fmt(plane, c1, c2, p1):
 # plane in addition to lines.  Note that if there is movement in the plane        #
 # perpendicular to the arc, it will be distorted, so 'plane' should usually       #
 # be specified only when there is only movement on 2 axes                         #
+#                                                                                 #
+# The path is never sliced.  An explicit stack of index ranges (a, b) over 'st'   #
+# replaces the recursion; entries with a == None are points waiting to be output  #
+# between the two halves of a split range.                                        #
 ################################################################################'''
-def douglas(st, tolerance=.001, plane=None, _first=True):
+def douglas(st, tolerance=.001, plane=None):
     if len(st) == 1:
         yield 'G1', st[0], None
         return
-    l1 = st[0]
-    l2 = st[-1]
-    worst_dist = 0
-    worst = 0
-    min_rad = MAXINT
-    max_arc = -1
-    ps = st[0]
-    pe = st[-1]
-    for i, p in enumerate(st):
-        if p is l1 or p is l2: continue
-        dist = dist_lseg(l1, l2, p)
-        if dist > worst_dist:
-            worst = i
-            worst_dist = dist
-            rad = arc_rad(plane, ps, p, pe)
-            if rad < min_rad:
-                max_arc = i
-                min_rad = rad
-    worst_arc_dist = 0
-    if min_rad != MAXINT:
-        c1, c2 = arc_center(plane, ps, st[max_arc], pe)
-        lx, ly, lz = st[0]
-        if one_quadrant(plane, (c1, c2), ps, st[max_arc], pe):
-            for i, (x,y,z) in enumerate(st):
-                if plane == 17: dist = abs(hypot(c1-x, c2-y) - min_rad)
-                elif plane == 18: dist = abs(hypot(c1-x, c2-z) - min_rad)
-                elif plane == 19: dist = abs(hypot(c1-y, c2-z) - min_rad)
-                else: dist = MAXINT
-                if dist > worst_arc_dist: worst_arc_dist = dist
-                mx = (x+lx)/2
-                my = (y+ly)/2
-                mz = (z+lz)/2
-                if plane == 17: dist = abs(hypot(c1-mx, c2-my) - min_rad)
-                elif plane == 18: dist = abs(hypot(c1-mx, c2-mz) - min_rad)
-                elif plane == 19: dist = abs(hypot(c1-my, c2-mz) - min_rad)
-                else: dist = MAXINT
-                lx, ly, lz = x, y, z
+    T = numpy.array(st, 'float64') if NUMPY else None
+    stack = [(0, len(st)-1, True)]
+    while stack:
+        a, b, first = stack.pop()
+        if a is None:
+            yield 'G1', st[b], None
+            continue
+        V = T if T is not None and b - a >= VECTOR_MIN else None
+        worst, worst_dist, records = douglas_worst(V, st, a, b)
+        c1, c2, max_arc, fits = arc_fit(plane, V, st, a, b, records, tolerance, worst_dist)
+        if fits:
+            ccw = arc_dir(plane, (c1, c2), st[a], st[max_arc], st[b])
+            if plane == 18: ccw = not ccw
+            yield 'G1', st[a], None
+            if ccw:
+                yield 'G3', st[b], arc_fmt(plane, c1, c2, st[a])
+            else:
+                yield 'G2', st[b], arc_fmt(plane, c1, c2, st[a])
+        elif worst_dist > tolerance:
+            if first:
+                yield 'G1', st[a], None
+                stack.append((None, b, None))
+            stack.append((worst, b, False))
+            stack.append((None, worst, None))
+            stack.append((a, worst, False))
         else:
-            worst_arc_dist = MAXINT
+            if first: yield 'G1', st[a], None
+            if first: yield 'G1', st[b], None
+
+'''################################################################################
+# Simplify one full look-ahead window of a scanline.  Only the moves up to the    #
+# second to last vertex douglas found are final, the points after it may still    #
+# merge with points that have not been cut yet.  Returns all the moves and the    #
+# index of that vertex, where the next window starts, or 0 when douglas keeps no  #
+# vertex inside the window.                                                       #
+################################################################################'''
+def douglas_window(st, tolerance=.001, plane=None):
+    moves = list(douglas(st, tolerance, plane))
+    p = moves[-2][1]
+    for k in range(len(st)-2, 0, -1):
+        if st[k] is p:
+            return moves, k
+    return moves, 0
+
+'''################################################################################
+# A straight open segment of a simplify window, kept as a sleeve around it so it  #
+# can grow past the window holding only its two ends.  It works on points that    #
+# move away from the anchor along one axis with the other one fixed, as on a row  #
+# or column.  Every point passed keeps the slope from the anchor in a range that  #
+# puts it within 'tolerance' in Z of the line, which is also within tolerance of  #
+# the segment; a new end is taken while its slope is still in that range.         #
+################################################################################'''
+class Sleeve:
+    def __init__(self, tolerance, anchor, axis):
+        self.tolerance = tolerance
+        self.axis = axis
+        self.fixed = anchor[1-axis]
+        self.s0 = float(anchor[axis])
+        self.z0 = float(anchor[2])
+        self.lo = -MAXINT
+        self.hi = MAXINT
+        self.last = None
+
+    def add(self, p):
+        ''' move the end of the segment to p if the points passed stay in the
+            sleeve, returns False and leaves it alone otherwise '''
+        if p[1-self.axis] != self.fixed: return False
+        d = float(p[self.axis]) - self.s0
+        if d == 0: return False
+        lo, hi = self.lo, self.hi
+        if self.last is not None:
+            ld, lz = self.last
+            if not d / ld > 1: return False
+            m1 = (lz - self.tolerance - self.z0) / ld
+            m2 = (lz + self.tolerance - self.z0) / ld
+            lo = max(lo, min(m1, m2))
+            hi = min(hi, max(m1, m2))
+        z = float(p[2])
+        if not lo <= (z - self.z0) / d <= hi: return False
+        self.lo, self.hi = lo, hi
+        self.last = d, z
+        return True
+
+def fit_sleeve(points, tolerance):
+    ''' a Sleeve through all the points, None if they do not fit one '''
+    if all(p[1] == points[0][1] for p in points):
+        sleeve = Sleeve(tolerance, points[0], 0)
+    elif all(p[0] == points[0][0] for p in points):
+        sleeve = Sleeve(tolerance, points[0], 1)
     else:
-        worst_arc_dist = MAXINT
-    if worst_arc_dist < tolerance and worst_arc_dist < worst_dist:
-        ccw = arc_dir(plane, (c1, c2), ps, st[max_arc], pe)
-        if plane == 18: ccw = not ccw
-        yield 'G1', ps, None
-        if ccw:
-            yield 'G3', st[-1], arc_fmt(plane, c1, c2, ps)
+        return None
+    for p in points[1:]:
+        if not sleeve.add(p): return None
+    return sleeve
+
+'''################################################################################
+# Coordinates are written in ten-thousandths.  fixed() gives a value as a whole   #
+# number of them, rounded the way f"{v:.4f}" rounds it: the product only differs  #
+# from the exact value by a rounding error, so only values that land next to a    #
+# half are formatted to be sure.  fixed_text() writes such a number from a table  #
+# of the ones written before, as most coordinates come up many times over.        #
+# Gcode.move_common does the same inline.                                         #
+################################################################################'''
+FIXED_TEXT = {}
+
+def fixed(v):
+    t = float(v) * 10000.0
+    q = round(t)
+    if not -0.499999 < t - q < 0.499999:
+        q = int(f"{v:.4f}".replace('.', ''))
+    return q
+
+def fixed_text(q, v):
+    if not q and copysign(1.0, v) < 0:
+        # as the format writes a negative value that rounds to zero
+        return '-0.0000'
+    try:
+        return FIXED_TEXT[q]
+    except KeyError:
+        if len(FIXED_TEXT) >= 1 << 18:
+            FIXED_TEXT.clear()
+        text = FIXED_TEXT[q] = f"{q / 10000.0:.4f}"
+        return text
+
+class GcodeFile:
+    ''' a Gcode target that writes the lines to the open file 'fout' in blocks
+        of about 'block' characters, and whatever is left when flushed '''
+    def __init__(self, fout, block=1 << 20):
+        self.fout = fout
+        self.block = block
+        self.lines = []
+        self.size = 0
+
+    def __call__(self, line):
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if self.size >= self.block:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.lines.append('')
+            self.fout.write('\n'.join(self.lines))
+            self.lines = []
+            self.size = 0
+        self.fout.flush()
+
+'''################################################################################
+# An optional last pass over the G-code for controllers that are fed over a slow  #
+# link or have little room for programs.  Lines pass through it on their way to   #
+# 'target', which it flushes when it is flushed.  Numbers lose leading and        #
+# trailing zeros and lines their spaces, motion modes, feeds and coordinates that #
+# are already in effect are left out, moves that go nowhere are dropped, and G1   #
+# moves that carry straight on, to within 'eps', are joined into one.  A feed on  #
+# a line of its own waits to go out with the next move.  Anything that is not a   #
+# plain line of words, or has G codes it does not know, goes through unchanged,   #
+# after any feed still waiting, and what it knows of the position is forgotten.   #
+# After a G91 everything goes through unchanged.                                  #
+################################################################################'''
+class CompactGcode:
+    WORD = re.compile(r'([A-Z])([-+]?[0-9]*\.?[0-9]*)')
+    MODAL = {'17', '18', '19', '20', '21', '40', '49', '54', '55', '56', '57', '58', '59',
+             '61', '64', '80', '90', '91.1', '94'}
+
+    def __init__(self, target, eps=0.0001):
+        self.write = target
+        self.eps = eps
+        self.size_in = self.size_out = 0
+        self.active = True
+        self.motion = None
+        self.feed = None
+        self.pending = None
+        self.pos = {}
+        self.run = None
+
+    def __call__(self, line):
+        self.size_in += len(line) + 1
+        text = line.replace(' ', '')
+        words = self.WORD.findall(text) if self.active and '(' not in line else []
+        if not words or ''.join(l + n for l, n in words) != text or \
+           any(n in ('', '.', '-', '+', '-.', '+.') for l, n in words):
+            self.put_run()
+            self.put_feed()
+            if self.active and text:
+                self.motion = None
+                self.pos = {}
+            self.emit(line)
+            return
+        words = [(l, compact_number(n)) for l, n in words]
+        motion = None
+        for l, n in words:
+            if l != 'G':
+                continue
+            if n in ('0', '1', '2', '3'):
+                motion = n
+            elif n == '91':
+                self.put_run()
+                self.put_feed()
+                self.active = False
+                self.emit(line)
+                return
+            elif n not in self.MODAL:
+                self.put_run()
+                self.put_feed()
+                self.motion = None
+                self.pos = {}
+                self.emit(line)
+                return
+        axes = [(l, n) for l, n in words if l in 'XYZA']
+        feed = [n for l, n in words if l == 'F']
+        feed = feed[-1] if feed else None
+        if not axes:
+            # modes, a feed or a program end; the feed waits for the next move
+            self.put_run()
+            words = [(l, n) for l, n in words if l != 'F' and (l, n) != ('G', self.motion)]
+            if feed is not None:
+                self.pending = None if feed == self.feed else feed
+            if motion is not None:
+                self.motion = motion
+            if words:
+                self.emit(''.join(l + n for l, n in words))
+            return
+        if feed is None and self.pending is not None:
+            feed = self.pending
+            words.append(('F', feed))
+        self.pending = None
+        if motion is None:
+            motion = self.run[2] if self.run else self.motion
+        start = self.run[1][-1] if self.run else self.pos
+        end = dict(start)
+        end.update(axes)
+        if motion == '1' and (feed is None or feed == self.feed) and \
+           all(l in 'XYZF' or (l, n) == ('G', '1') for l, n in words):
+            if end == start:
+                return
+            if self.run and self.straight(self.run[0], self.run[1] + [end]):
+                self.run[1].append(end)
+                return
+            self.put_run()
+            if all(a in self.pos and a in end for a in 'XYZ'):
+                self.run = (self.pos, [end], motion)
+                return
+        self.put_run()
+        if motion in ('0', '1'):
+            axes = [(l, n) for l, n in axes if self.pos.get(l) != n]
+            if not axes:
+                if feed is not None and feed != self.feed:
+                    self.pending = feed
+                return
+        out = []
+        if motion != self.motion:
+            out.append('G' + motion)
+        for l, n in words:
+            if l == 'G':
+                if n not in ('0', '1', '2', '3'):
+                    out.append(l + n)
+            elif l in 'XYZA':
+                if (l, n) in axes:
+                    out.append(l + n)
+            elif l == 'F':
+                if n != self.feed:
+                    out.append(l + n)
+            else:
+                out.append(l + n)
+        self.motion = motion
+        if feed is not None:
+            self.feed = feed
+        self.pos = end
+        self.emit(''.join(out))
+
+    def straight(self, start, points):
+        ''' whether all the points lie within eps of the line from start to the
+            last of them, in order along it '''
+        x0, y0, z0 = (float(start[a]) for a in 'XYZ')
+        x1, y1, z1 = (float(points[-1][a]) - v for a, v in zip('XYZ', (x0, y0, z0)))
+        length = sqrt(x1 * x1 + y1 * y1 + z1 * z1)
+        if length == 0:
+            return False
+        last = 0.0
+        for p in points[:-1]:
+            dx, dy, dz = (float(p[a]) - v for a, v in zip('XYZ', (x0, y0, z0)))
+            along = (dx * x1 + dy * y1 + dz * z1) / length
+            off = (dy * z1 - dz * y1, dz * x1 - dx * z1, dx * y1 - dy * x1)
+            if along < last or sqrt(sum(c * c for c in off)) / length > self.eps:
+                return False
+            last = along
+        return True
+
+    def put_run(self):
+        ''' write out the G1 moves that have been joined so far '''
+        if self.run is None:
+            return
+        start, points, motion = self.run
+        self.run = None
+        end = points[-1]
+        out = [] if self.motion == '1' else ['G1']
+        out += [a + end[a] for a in 'XYZA' if a in end and start.get(a) != end[a]]
+        self.motion = '1'
+        self.pos = end
+        self.emit(''.join(out))
+
+    def put_feed(self):
+        ''' write out the feed that is waiting for a move '''
+        if self.pending is None:
+            return
+        self.feed = self.pending
+        self.pending = None
+        self.emit('F' + self.feed)
+
+    def emit(self, line):
+        self.size_out += len(line) + 1
+        self.write(line)
+
+    def flush(self):
+        self.put_run()
+        flush = getattr(self.write, 'flush', None)
+        if flush:
+            flush()
+
+    def report(self):
+        smaller = 100.0 * (1 - self.size_out / max(self.size_in, 1))
+        return f"Compact Output {self.size_out} of {self.size_in} characters, {smaller:.0f}% smaller"
+
+def compact_number(n):
+    ''' the number n without the zeros it does not need, or a decimal point with
+        nothing after it '''
+    if '.' in n:
+        n = n.rstrip('0').rstrip('.')
+        if n.startswith(('0.', '-0.', '+0.')):
+            n = n.replace('0', '', 1)
+    if n in ('', '-', '+', '-0', '+0'):
+        n = '0'
+    return n
+
+'''################################################################################
+# A binary record of the G-code that can be saved and turned back into the same   #
+# G-code in a fraction of the time it took to make.  Lines pass through it to     #
+# 'target', if there is one.  A line that is a motion mode and X, Y, Z, I, J, K   #
+# and F words, in that order and written to four places, is kept as a move: the   #
+# motion mode and the position and feed in effect after it, the I, J and K of an  #
+# arc and which words it has.  Anything else is kept as text.  The saved .npz     #
+# file needs NumPy, as does toolpath_gcode() which writes the G-code back out a   #
+# block of lines at a time with array operations on the digits.                   #
+################################################################################'''
+class ToolpathRecorder:
+    LETTERS = 'GXYZIJKF'
+    NUMBER = re.compile(r'-?(0|[1-9][0-9]*)\.[0-9]{4}$')
+    # a bit for each of LETTERS, and one for a line that starts with a space
+    LEAD = 1 << 8
+
+    def __init__(self, target=None):
+        self.target = target
+        self.motion = array.array('b')
+        self.words = array.array('H')
+        self.xyz = array.array('d')
+        self.centre = array.array('d')
+        self.feed = array.array('d')
+        self.text = []
+        self.mode = -1
+        self.pos = [nan, nan, nan]
+        self.rate = nan
+
+    def __call__(self, line):
+        if self.target is not None:
+            self.target(line)
+        parsed = self.parse(line)
+        if parsed is None:
+            self.text.append(line)
+            bits = 0
+            centre = (nan, nan, nan)
         else:
-            yield 'G2', st[-1], arc_fmt(plane, c1, c2, ps)
-    elif worst_dist > tolerance:
-        if _first: yield 'G1', st[0], None
-        for i in douglas(st[:worst+1], tolerance, plane, False):
-            yield i
-        yield 'G1', st[worst], None
-        for i in douglas(st[worst:], tolerance, plane, False):
-            yield i
-        if _first: yield 'G1', st[-1], None
-    else:
-        if _first: yield 'G1', st[0], None
-        if _first: yield 'G1', st[-1], None
+            bits, values = parsed
+            if 0 in values:
+                self.mode = values[0]
+            for k in (1, 2, 3):
+                if k in values:
+                    self.pos[k - 1] = values[k]
+            if 7 in values:
+                self.rate = values[7]
+            centre = (values.get(4, nan), values.get(5, nan), values.get(6, nan))
+        self.motion.append(self.mode)
+        self.words.append(bits)
+        self.xyz.extend(self.pos)
+        self.centre.extend(centre)
+        self.feed.append(self.rate)
+
+    def parse(self, line):
+        ''' the bits of the words in 'line' and their values, or None when
+            it is not a move that can be written back the same way '''
+        tokens = line.split(' ')
+        bits = 0
+        if tokens[0] == '' and len(tokens) > 1 and tokens[1][:1] != 'G':
+            bits = self.LEAD
+            del tokens[0]
+        values = {}
+        last = -1
+        for t in tokens:
+            k = self.LETTERS.find(t[0]) if t else -1
+            if k <= last:
+                return None
+            if k == 0:
+                if t not in ('G0', 'G1', 'G2', 'G3'):
+                    return None
+                values[k] = int(t[1])
+            elif self.NUMBER.match(t, 1):
+                values[k] = float(t[1:])
+            else:
+                return None
+            bits |= 1 << k
+            last = k
+        return bits, values
+
+    def flush(self):
+        flush = getattr(self.target, 'flush', None)
+        if flush:
+            flush()
+
+    def save(self, file):
+        ''' write the record to 'file', a file name or an open binary file, as
+            a compressed .npz file '''
+        numpy.savez_compressed(file,
+                               motion=numpy.frombuffer(self.motion, numpy.int8),
+                               words=numpy.frombuffer(self.words, numpy.uint16),
+                               xyz=numpy.frombuffer(self.xyz).reshape(-1, 3),
+                               centre=numpy.frombuffer(self.centre).reshape(-1, 3),
+                               feed=numpy.frombuffer(self.feed),
+                               text=numpy.array(self.text, dtype=str))
+
+def toolpath_gcode(filename, target, block=1 << 16):
+    ''' write the G-code of a toolpath saved by a ToolpathRecorder to 'target'
+        a line at a time, and flush it at the end if it can be flushed '''
+    with numpy.load(filename) as data:
+        motion, words, xyz, centre, feed = \
+            (data[k] for k in ('motion', 'words', 'xyz', 'centre', 'feed'))
+        texts = iter(data['text'].tolist())
+    columns = numpy.hstack([xyz, centre, feed[:, None]])
+    for start in range(0, len(words), block):
+        rows = slice(start, start + block)
+        for line in toolpath_lines(motion[rows], words[rows], columns[rows]):
+            target(line if line else next(texts))
+    flush = getattr(target, 'flush', None)
+    if flush:
+        flush()
+
+def toolpath_lines(motion, words, columns):
+    ''' the lines of a block of toolpath moves, with an empty line for each
+        line of text.  The lines are built as rows of characters with zeros
+        where there are none, which are then left out. '''
+    g = (words & 1).astype(bool)
+    head = numpy.zeros((len(words), 2), numpy.uint8)
+    head[g, 0] = ord('G')
+    head[g, 1] = ord('0') + motion[g]
+    fields = [head]
+    for k, letter in enumerate('XYZIJKF', 1):
+        fields.append(number_chars(letter, columns[:, k - 1], (words >> k & 1).astype(bool)))
+    fields.append(numpy.full((len(words), 1), ord('\n'), numpy.uint8))
+    chars = numpy.hstack(fields)
+    # the first word has a space in front of it only on a line that had one
+    bare = ~g & (words & ToolpathRecorder.LEAD == 0) & (words != 0)
+    first = (chars != 0).argmax(axis=1)
+    chars[bare, first[bare]] = 0
+    return chars[chars != 0].tobytes().decode('ascii').split('\n')[:-1]
+
+def number_chars(letter, v, present):
+    ''' rows of the characters of ' <letter><v>' with v to four places, or of
+        zeros where it is not present '''
+    v = numpy.where(present, v, 0.0)
+    q = numpy.rint(numpy.abs(v) * 10000.0).astype(numpy.int64)
+    width = max(5, len(str(int(q.max())))) if len(q) else 5
+    powers = 10 ** numpy.arange(width - 1, -1, -1, dtype=numpy.int64)
+    digits = (q[:, None] // powers % 10 + ord('0')).astype(numpy.uint8)
+    # no zeros in front of the ones digit
+    digits[:, :width - 5][q[:, None] < powers[:width - 5]] = 0
+    out = numpy.zeros((len(q), width + 4), numpy.uint8)
+    out[:, 0] = ord(' ')
+    out[:, 1] = ord(letter)
+    out[numpy.signbit(v), 2] = ord('-')
+    out[:, 3:width - 1] = digits[:, :width - 4]
+    out[:, width - 1] = ord('.')
+    out[:, width:] = digits[:, width - 4:]
+    out[~present] = 0
+    return out
 
 class Gcode:
     def __init__(self, homeheight = 1.5, safetyheight = 0.04,
                  tolerance=0.001, units='G20', header='', postscript='',
                  target=lambda s: sys.stdout.write(s + '\n'),
-                 disable_arcs = False):
+                 disable_arcs = False, window = 0, stats = None):
         self.lastx = self.lasty = self.lastz = self.lasta = None
         self.lastgcode = self.lastfeed = None
         self.homeheight = homeheight
         self.safetyheight = self.lastz = safetyheight
+        # the last position written, in ten-thousandths
+        self.lastq = [None, None, fixed(safetyheight), None]
         self.tolerance = tolerance
         self.units = units
         self.cuts = []
+        self.engage = []
+        self.feed_range = None
         self.write = target
         self.time = 0
         self.plane = None
         self.header = header
         self.postscript = postscript
         self.disable_arcs = disable_arcs
+        self.window = window
+        self.sleeve = None
+        self.stats = stats
 
     def set_plane(self, p):
         if (not self.disable_arcs):
@@ -2243,16 +3443,71 @@ class Gcode:
         ''' if any 'cut' moves are stored up, send them to the
             simplification algorithm and actually output them '''
         if not self.cuts: return
-        for move, (x, y, z), cent in douglas(self.cuts, self.tolerance, self.plane):
+        self.emit(self.engaged(douglas(self.cuts, self.tolerance, self.plane)))
+        self.cuts = []
+        self.engage = []
+        self.sleeve = None
+
+    def engaged(self, moves):
+        ''' the douglas moves of self.cuts with the engagement of each, the
+            highest of the cuts it stands for, or None when they have none '''
+        if self.engage.count(None) == len(self.engage):
+            return [(move, p, cent, None) for move, p, cent in moves]
+        index = {id(p): k for k, p in enumerate(self.cuts)}
+        out = []
+        last = -1
+        for move, p, cent in moves:
+            k = index[id(p)]
+            e = [v for v in self.engage[last+1:k+1] if v is not None]
+            out.append((move, p, cent, max(e) if e else None))
+            last = max(last, k)
+        return out
+
+    def emit(self, moves):
+        ''' output moves that have already been simplified by douglas '''
+        for move, (x, y, z), cent, engage in moves:
+            feed = self.plan_feed(x, y, z, engage)
             if cent:
-                self.write(f"{move} X{x:.4f} Y{y:.4f} Z{z:.4f} {cent}")
+                qx, qy, qz = fixed(x), fixed(y), fixed(z)
+                self.write(''.join([move, ' X', fixed_text(qx, x), ' Y', fixed_text(qy, y),
+                                    ' Z', fixed_text(qz, z), ' ', cent, self.feed_word(feed)]))
+                if self.stats is not None:
+                    self.stats.arc(move, self.plane, (self.lastx, self.lasty, self.lastz), (x, y, z),
+                                   cent, self.lastfeed)
                 self.lastgcode = None
                 self.lastx = x
                 self.lasty = y
                 self.lastz = z
+                self.lastq[:3] = qx, qy, qz
             else:
-                self.move_common(x, y, z, gcode='G1')
-        self.cuts = []
+                self.move_common(x, y, z, gcode='G1', feed=feed)
+
+    '''################################################################################
+    # The feed for a cut from where the tool is to (x, y, z) when feed_range is set.  #
+    # It goes from the high end of the range for a level cut, or one that takes no    #
+    # material, down to the low end for a plunge at full engagement, with the sine of #
+    # the slope of the move times 'engage', the part of a full cut it takes, as the   #
+    # load between them.  The load is rounded up to eighths so that F words do not    #
+    # change on every line.  Moves without an engagement keep the modal feed.         #
+    ################################################################################'''
+    def plan_feed(self, x, y, z, engage):
+        if self.feed_range is None or engage is None or \
+           self.lastx is None or self.lasty is None:
+            return None
+        low, high = self.feed_range
+        run = hypot(x - self.lastx, y - self.lasty)
+        rise = abs(z - self.lastz)
+        if run + rise == 0:
+            return None
+        load = engage * rise / hypot(run, rise)
+        return high - (high - low) * ceil(load * 8 - epsilon) / 8
+
+    def feed_word(self, feed):
+        ''' the F word for 'feed' when it changes the modal feed '''
+        if feed is None or feed == self.lastfeed:
+            return ''
+        self.lastfeed = feed
+        return f" F{feed:.4f}"
 
     def end(self):
         ''' end the program '''
@@ -2262,47 +3517,87 @@ class Gcode:
             self.write('M2')
         else:
             self.write(self.postscript)
+        if self.stats is not None:
+            self.stats.finish()
 
     def rapid(self, x=None, y=None, z=None, a=None):
         ''' perform a rapid move to the specified coordinates '''
         self.flush()
         self.move_common(x, y, z, a, 'G0')
 
-    def move_common(self, x=None, y=None, z=None, a=None, gcode='G0'):
-        ''' an internal function used for G0 and G1 moves '''
-        gcodestring = xstring = ystring = zstring = astring = ''
-        if x == None: x = self.lastx
-        if y == None: y = self.lasty
-        if z == None: z = self.lastz
-        if a == None: a = self.lasta
-        if x != self.lastx:
-                xstring = f" X{x:.4f}"
+    def move_common(self, x=None, y=None, z=None, a=None, gcode='G0', feed=None):
+        ''' an internal function used for G0 and G1 moves, an axis is only
+            written when it moves by a ten-thousandth it can be written in '''
+        start = (self.lastx, self.lasty, self.lastz)
+        words = []
+        lastq = self.lastq
+        texts = FIXED_TEXT
+        if x is not None and x != self.lastx:
+            t = float(x) * 10000.0
+            q = round(t)
+            if not -0.499999 < t - q < 0.499999:
+                q = fixed(x)
+            if q != lastq[0]:
+                text = texts.get(q) if q or x > 0 else None
+                words += (' X', text or fixed_text(q, x))
+                lastq[0] = q
                 self.lastx = x
-        if y != self.lasty:
-                ystring = f" Y{y:.4f}"
+        if y is not None and y != self.lasty:
+            t = float(y) * 10000.0
+            q = round(t)
+            if not -0.499999 < t - q < 0.499999:
+                q = fixed(y)
+            if q != lastq[1]:
+                text = texts.get(q) if q or y > 0 else None
+                words += (' Y', text or fixed_text(q, y))
+                lastq[1] = q
                 self.lasty = y
-        if z != self.lastz:
-                zstring = f" Z{z:.4f}"
+        if z is not None and z != self.lastz:
+            t = float(z) * 10000.0
+            q = round(t)
+            if not -0.499999 < t - q < 0.499999:
+                q = fixed(z)
+            if q != lastq[2]:
+                text = texts.get(q) if q or z > 0 else None
+                words += (' Z', text or fixed_text(q, z))
+                lastq[2] = q
                 self.lastz = z
-        if a != self.lasta:
-                astring = f" A{a:.4f}"
+        if a is not None and a != self.lasta:
+            t = float(a) * 10000.0
+            q = round(t)
+            if not -0.499999 < t - q < 0.499999:
+                q = fixed(a)
+            if q != lastq[3]:
+                text = texts.get(q) if q or a > 0 else None
+                words += (' A', text or fixed_text(q, a))
+                lastq[3] = q
                 self.lasta = a
-        if xstring == ystring == zstring == astring == '':
+        if not words:
             return
         if gcode != self.lastgcode:
-                gcodestring = gcode
-                self.lastgcode = gcode
-        cmd = ''.join([gcodestring, xstring, ystring, zstring, astring])
-        if cmd:
-            self.write(cmd)
+            words.insert(0, gcode)
+            self.lastgcode = gcode
+        words.append(self.feed_word(feed))
+        self.write(''.join(words))
+        if self.stats is not None:
+            self.stats.move(gcode, start, (self.lastx, self.lasty, self.lastz), self.lastfeed)
+
+    def moved(self, x, y, z):
+        ''' the tool is at (x, y, z) after a move written out some other way '''
+        self.lastx = x
+        self.lasty = y
+        self.lastz = z
+        self.lastq[:3] = fixed(x), fixed(y), fixed(z)
 
     def set_feed(self, feed):
         ''' set the feed rate to the given value '''
         self.flush()
         self.write(f"F{feed:.4f}")
+        self.lastfeed = feed
 
-    def cut(self, x=None, y=None, z=None):
-        ''' perform a cutting move at the specified feed rate to the specified coordinates '''
+    def cut(self, x=None, y=None, z=None, engage=None):
+        ''' perform a cutting move at the specified feed rate to the specified coordinates,
+            'engage' is the part of a full cut it takes for planned feeds '''
         if self.cuts:
             lastx, lasty, lastz = self.cuts[-1]
         else:
@@ -2310,7 +3605,36 @@ class Gcode:
         if x is None: x = lastx
         if y is None: y = lasty
         if z is None: z = lastz
+        if self.sleeve is not None:
+            if self.sleeve.add((x, y, z)):
+                self.cuts[-1] = [x,y,z]
+                if self.engage[-1] is None or (engage is not None and engage > self.engage[-1]):
+                    self.engage[-1] = engage
+                return
+            # the straight segment ends at the last point
+            self.emit(self.engaged([('G1', self.cuts[-1], None)]))
+            del self.cuts[:-1]
+            del self.engage[:-1]
+            self.sleeve = None
         self.cuts.append([x,y,z])
+        self.engage.append(engage)
+        if self.window and len(self.cuts) >= self.window:
+            # streaming mode, output what is final and keep the rest
+            moves, k = douglas_window(self.cuts, self.tolerance, self.plane)
+            if k == 0:
+                self.sleeve = fit_sleeve(self.cuts, self.tolerance)
+            if k == 0 and self.sleeve is None:
+                self.emit(self.engaged(moves))
+                del self.cuts[:-1]
+                del self.engage[:-1]
+            elif k == 0:
+                self.emit(self.engaged(moves[:-1]))
+                del self.cuts[1:-1]
+                del self.engage[1:-1]
+            else:
+                self.emit(self.engaged(moves[:-1]))
+                del self.cuts[:k]
+                del self.engage[:k]
 
     def home(self):
         ''' go to the 'home' height at rapid speed '''
@@ -2321,6 +3645,154 @@ class Gcode:
         self.flush()
         self.rapid(z=self.safetyheight)
 
+def hms(seconds):
+    ''' 'seconds' as hours:minutes:seconds '''
+    m, s = divmod(int(round(seconds)), 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02d}:{s:02d}"
+
+'''################################################################################
+# Toolpath statistics and cycle time, gathered from the moves a Gcode makes as it #
+# makes them so that nothing has to be written out or read back.  'rates' are the #
+# top speeds of the X, Y and Z axes in units per minute and 'accels' their        #
+# accelerations in units per second squared.  A move goes no faster than its feed #
+# (a rapid no faster than its axes allow) and speeds up and slows down as fast as #
+# its slowest axis allows.  A corner is taken at the speed that keeps the tool    #
+# within 'deviation' of it, an arc no faster than its radial acceleration allows. #
+# The speeds at the ends of the moves are planned over the whole program in       #
+# finish(), back from the end and then forward from the start, the way a          #
+# look-ahead trajectory planner would, and the time of each move comes from its   #
+# trapezoidal speed profile.  A plunge is a feed move straight down.              #
+################################################################################'''
+class MoveStats:
+    def __init__(self, rates, accels, deviation):
+        self.rates = [r / 60.0 for r in rates]
+        self.accels = list(accels)
+        self.deviation = deviation
+        self.feed_dist = 0.0
+        self.plunge_dist = 0.0
+        self.rapid_dist = 0.0
+        self.counts = {'G0': 0, 'G1': 0, 'G2': 0, 'G3': 0}
+        # length, top speed, acceleration and corner speed into each move
+        self.plan = [array.array('d') for k in range(4)]
+        self.last = None
+        self.time = 0.0
+
+    def limits(self, u):
+        ''' the top speed and acceleration along the unit vector u '''
+        v = a = inf
+        for k in range(3):
+            if abs(u[k]) > epsilon:
+                v = min(v, self.rates[k] / abs(u[k]))
+                a = min(a, self.accels[k] / abs(u[k]))
+        return v, a
+
+    def move(self, gcode, p0, p1, feed):
+        ''' a straight move from p0 to p1, at 'feed' unless it is a rapid '''
+        d = [0.0 if a is None or b is None else b - a for a, b in zip(p0, p1)]
+        length = sqrt(d[0]*d[0] + d[1]*d[1] + d[2]*d[2])
+        if length == 0:
+            return
+        self.counts[gcode] += 1
+        if gcode == 'G0':
+            self.rapid_dist += length
+        elif hypot(d[0], d[1]) < epsilon and d[2] < 0:
+            self.plunge_dist += length
+        else:
+            self.feed_dist += length
+        u = [c / length for c in d]
+        v, a = self.limits(u)
+        if gcode != 'G0' and feed:
+            v = min(v, feed / 60.0)
+        self.add(length, v, a, u, u)
+
+    def arc(self, gcode, plane, p0, p1, cent, feed):
+        ''' an arc from p0 to p1 in 'plane', 'cent' its I, J and K words '''
+        off = {w[0]: float(w[1:]) for w in cent.split()}
+        c = [p0[k] + off.get('IJK'[k], 0.0) for k in range(3)]
+        a1, a2 = plane_axes[plane]
+        h = 3 - a1 - a2
+        s = (p0[a1] - c[a1], p0[a2] - c[a2])
+        e = (p1[a1] - c[a1], p1[a2] - c[a2])
+        r = hypot(*s)
+        turn = atan2(s[0]*e[1] - s[1]*e[0], s[0]*e[0] + s[1]*e[1])
+        # G2 and G3 swap over in the XZ plane, see douglas
+        ccw = (gcode == 'G3') != (plane == 18)
+        if not ccw:
+            turn = -turn
+        if turn <= 0:
+            turn += 2 * pi
+        rise = p1[h] - p0[h]
+        length = hypot(r * turn, rise)
+        if length == 0:
+            return
+        self.counts[gcode] += 1
+        self.feed_dist += length
+        sign = 1 if ccw else -1
+        def tangent(q):
+            u = [0.0, 0.0, 0.0]
+            u[a1] = -sign * q[1] * turn / length
+            u[a2] = sign * q[0] * turn / length
+            u[h] = rise / length
+            return u
+        v = min(self.rates[a1], self.rates[a2])
+        a = min(self.accels[a1], self.accels[a2])
+        v = min(v, sqrt(a * r))
+        if feed:
+            v = min(v, feed / 60.0)
+        self.add(length, v, a, tangent(s), tangent(e))
+
+    def add(self, length, v, a, u0, u1):
+        ''' plan a move that starts in the direction u0 and ends in u1 '''
+        if self.last is None:
+            corner = 0.0
+        else:
+            u, la, lv = self.last
+            cos = -(u[0]*u0[0] + u[1]*u0[1] + u[2]*u0[2])
+            if cos > 1 - epsilon:
+                corner = 0.0
+            elif cos < epsilon - 1:
+                corner = inf
+            else:
+                s = sqrt(0.5 * (1 - cos))
+                corner = sqrt(min(a, la) * self.deviation * s / (1 - s))
+            corner = min(corner, v, lv)
+        for k, value in enumerate((length, v, a, corner)):
+            self.plan[k].append(value)
+        self.last = (u1, a, v)
+
+    def finish(self):
+        ''' plan the speeds and add up the time, the machine stopped at the end '''
+        L, V, A, C = self.plan
+        n = len(L)
+        entry = array.array('d', C)
+        v = 0.0
+        for k in range(n-1, -1, -1):
+            v = entry[k] = min(entry[k], sqrt(v*v + 2*A[k]*L[k]))
+        t = 0.0
+        v0 = 0.0
+        for k in range(n):
+            v0 = min(v0, entry[k])
+            v1 = entry[k+1] if k+1 < n else 0.0
+            v1 = min(v1, sqrt(v0*v0 + 2*A[k]*L[k]))
+            up = (V[k]*V[k] - v0*v0) / (2*A[k])
+            down = (V[k]*V[k] - v1*v1) / (2*A[k])
+            if up + down <= L[k]:
+                t += (V[k] - v0) / A[k] + (V[k] - v1) / A[k] + (L[k] - up - down) / V[k]
+            else:
+                top = sqrt((2*A[k]*L[k] + v0*v0 + v1*v1) / 2)
+                t += (top - v0) / A[k] + (top - v1) / A[k]
+            v0 = v1
+        self.time = t
+        self.last = None
+
+    def report(self, units):
+        ''' a one line summary '''
+        return (f"Cycle Time {hms(self.time)}, Feed {self.feed_dist:.1f}, "
+                f"Plunge {self.plunge_dist:.1f}, Rapid {self.rapid_dist:.1f} {units}, "
+                f"{self.counts['G1']} Lines, {self.counts['G2'] + self.counts['G3']} Arcs, "
+                f"{self.counts['G0']} Rapids")
+
 
 '''########################
 #     image-to-gcode      #
@@ -2341,6 +3813,34 @@ def vee_common(angle, rough_offset=0.0):
         return r * slope
     return f
 
+''' The height above the tool tip of the ridge two cuts 'step' pixels apart
+    leave between them, None when the tool cannot reach across to the middle '''
+def cusp_height(tool, step):
+    c = (tool.width - 1) // 2
+    k = c + (step + 1) // 2
+    if k >= tool.width:
+        return None
+    h = float(tool(c, k) - tool(c, c))
+    if isinf(h):
+        return None
+    return h
+
+''' The widest stepover two cuts of the tool profile 'f' of radius 'rad' can be
+    apart and leave a ridge no higher than 'height' between them on flat ground '''
+def scallop_stepover(f, rad, height):
+    base = f(0.0, rad)
+    if f(rad, rad) - base <= height:
+        return 2.0 * rad
+    lo = 0.0
+    hi = rad
+    for n in range(50):
+        r = (lo + hi) / 2.0
+        if f(r, rad) - base <= height:
+            lo = r
+        else:
+            hi = r
+    return 2.0 * lo
+
 def make_tool_shape(f, wdia, pixel_size, rough_offset=0.0):
     res = 1. / pixel_size
     wrad = wdia/2.0 + rough_offset
@@ -2372,6 +3872,175 @@ def make_tool_shape(f, wdia, pixel_size, rough_offset=0.0):
     TOOL.minus(TOOL.min()+rough_offset)
     return TOOL
 
+'''################################################################################
+# The surface roughing leaves on 'image', without the steps between its levels.   #
+# The roughing tool center follows the compensated surface of 'tool', the cutter  #
+# grown by the roughing offset, and the cutter itself leaves the lowest point it  #
+# reaches over each pixel from there.  The result is a list of rows, or an array  #
+# with NumPy.                                                                     #
+################################################################################'''
+def rough_envelope(image, tool, cutter):
+    w, h = image.shape
+    if NUMPY:
+        ts = tool.width
+        r = (ts - 1) // 2
+        P = numpy.full((w + 2*r, h + 2*r), -numpy.inf, 'float32')
+        P[r:r+w, r:r+h] = image.matrix
+        comp = numpy.full((w, h), -numpy.inf, 'float32')
+        for a in range(ts):
+            for b in range(ts):
+                if not isinf(tool.matrix[a, b]):
+                    numpy.maximum(comp, P[a:a+w, b:b+h] - tool.matrix[a, b], out=comp)
+        numpy.minimum(comp, 0.0, out=comp)
+        cs = cutter.width
+        r = (cs - 1) // 2
+        P = numpy.full((w + 2*r, h + 2*r), numpy.inf, 'float32')
+        P[r:r+w, r:r+h] = comp
+        left = numpy.full((w, h), numpy.inf, 'float32')
+        for a in range(cs):
+            for b in range(cs):
+                if not isinf(cutter.matrix[a, b]):
+                    numpy.minimum(left, P[a:a+w, b:b+h] + cutter.matrix[a, b], out=left)
+        return left
+    def offsets(shape):
+        r = (shape.width - 1) // 2
+        return [(a - r, b - r, shape.matrix[a][b]) for a in range(shape.width)
+                for b in range(shape.width) if not isinf(shape.matrix[a][b])]
+    M = image.matrix
+    offs = offsets(tool)
+    comp = [[min(0.0, max(M[y+dy][x+dx] - t for dy, dx, t in offs
+                          if 0 <= y+dy < w and 0 <= x+dx < h))
+             for x in range(h)] for y in range(w)]
+    offs = offsets(cutter)
+    return [[min(comp[y+dy][x+dx] + t for dy, dx, t in offs
+                 if 0 <= y+dy < w and 0 <= x+dx < h)
+             for x in range(h)] for y in range(w)]
+
+'''################################################################################
+# Marching squares.  The loops where the grid F, indexed F[j][i], crosses zero,   #
+# as lists of (i, j) points on the cell edges with the last point the same as the #
+# first.  Off the grid counts as above zero, so every loop closes.  The cells are #
+# classed by their corners below zero all at once with NumPy; only the cells a    #
+# loop passes through are visited one by one.  Each loop runs with the part below #
+# zero on its left taking j as going down the image (y up), and a cell with two   #
+# corners below zero across from each other joins them when its center is below   #
+# zero too.                                                                       #
+################################################################################'''
+def iso_loops(F):
+    if NUMPY:
+        F = numpy.pad(numpy.asarray(F, 'float64'), 1, constant_values=1.0)
+        low = F < 0
+        case = low[1:, :-1] + 2*low[1:, 1:] + 4*low[:-1, 1:] + 8*low[:-1, :-1]
+        rows, cols = numpy.nonzero((case > 0) & (case < 15))
+        cells = zip(rows.tolist(), cols.tolist())
+        F = F.tolist()
+    else:
+        h = len(F[0]) + 2
+        F = [[1.0] * h] + [[1.0] + [float(v) for v in row] + [1.0] for row in F] + [[1.0] * h]
+        cells = [(j, i) for j in range(len(F) - 1) for i in range(h - 1)
+                 if 0 < (F[j][i] < 0) + (F[j][i+1] < 0) + (F[j+1][i] < 0) + (F[j+1][i+1] < 0) < 4]
+    n = len(F[0])
+    def key(r, c, vertical):
+        return (r * n + c) * 2 + vertical
+    def point(e):
+        rc, vertical = divmod(e, 2)
+        r, c = divmod(rc, n)
+        if vertical:
+            return (c - 1, r - 1 + F[r][c] / (F[r][c] - F[r+1][c]))
+        return (c - 1 + F[r][c] / (F[r][c] - F[r][c+1]), r - 1)
+    nxt = {}
+    for j, i in cells:
+        # corners and edges counterclockwise from the bottom left, edge k
+        # going from corner k to corner k+1
+        v = (F[j+1][i], F[j+1][i+1], F[j][i+1], F[j][i])
+        edges = (key(j+1, i, 0), key(j, i+1, 1), key(j, i, 0), key(j, i, 1))
+        outs = [k for k in range(4) if v[k] < 0 and not v[(k+1) % 4] < 0]
+        ins = [k for k in range(4) if not v[k] < 0 and v[(k+1) % 4] < 0]
+        if len(outs) == 1:
+            pairs = ((outs[0], ins[0]),)
+        elif sum(v) < 0:
+            pairs = [(k, (k+1) % 4) for k in outs]
+        else:
+            pairs = [(k, (k-1) % 4) for k in outs]
+        for a, b in pairs:
+            nxt[edges[a]] = edges[b]
+    loops = []
+    while nxt:
+        e0, e = nxt.popitem()
+        pts = [point(e0)]
+        while e != e0:
+            pts.append(point(e))
+            e = nxt.pop(e)
+        pts.append(pts[0])
+        loops.append(pts)
+    return loops
+
+'''################################################################################
+# The distance from each set pixel of 'mask' to the nearest pixel that is not,    #
+# pixels off the grid counting as not set.  The distance along each column comes  #
+# first, from a pass down and a pass up, then each row takes the lowest of the    #
+# column distances combined with the distance across.  An array with NumPy, a     #
+# list of rows otherwise.                                                         #
+################################################################################'''
+def distance_field(mask):
+    if NUMPY:
+        w, h = mask.shape
+        g = numpy.zeros((w, h))
+        run = numpy.zeros(h)
+        for j in range(w):
+            run = numpy.where(mask[j], run + 1, 0)
+            g[j] = run
+        run = numpy.zeros(h)
+        for j in range(w-1, -1, -1):
+            run = numpy.where(mask[j], run + 1, 0)
+            numpy.minimum(g[j], run, out=g[j])
+        g = g * g
+        i = numpy.arange(h)
+        across = (i[:, None] - i[None, :]) ** 2.0
+        D = numpy.empty((w, h))
+        n = max(1, 4000000 // (h * h))
+        for j in range(0, w, n):
+            D[j:j+n] = (g[j:j+n, None, :] + across[None]).min(axis=2)
+        numpy.minimum(D, numpy.minimum(i + 1, h - i) ** 2.0, out=D)
+        return numpy.sqrt(D)
+    w, h = len(mask), len(mask[0])
+    g = [[0] * h for j in range(w)]
+    run = [0] * h
+    for j in range(w):
+        run = [r + 1 if m else 0 for r, m in zip(run, mask[j])]
+        g[j] = run
+    run = [0] * h
+    for j in range(w-1, -1, -1):
+        run = [r + 1 if m else 0 for r, m in zip(run, mask[j])]
+        g[j] = [min(a, b) for a, b in zip(g[j], run)]
+    D = []
+    for row in g:
+        out = []
+        for i in range(h):
+            best = min(row[i] ** 2, (i + 1) ** 2, (h - i) ** 2)
+            d = 1
+            while d * d < best:
+                for k in (i - d, i + d):
+                    if 0 <= k < h:
+                        best = min(best, row[k] ** 2 + d * d)
+                d += 1
+            out.append(sqrt(best))
+        D.append(out)
+    return D
+
+def loop_area(pts):
+    ''' the signed area of the closed loop 'pts', positive counterclockwise '''
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(pts, pts[1:])) / 2.0
+
+def inside_loop(p, pts):
+    ''' True when the point p is inside the closed loop 'pts' '''
+    x, y = p
+    c = False
+    for (x1, y1), (x2, y2) in zip(pts, pts[1:]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            c = not c
+    return c
+
 def amax(seq):
     res = 0
     for i in seq:
@@ -2395,6 +4064,31 @@ def group_by_sign(seq, slop=sin(pi/18), key=lambda x:x):
                 subseq = [i]
     if subseq: yield subseq
 
+'''################################################################################
+# One scanline of milldata made on demand from its pixel numbers, so a whole line #
+# is never held as a list.  point(i) makes the milldata of pixel i.  It does what #
+# the scan converters and entry cuts do with a scan: iterate, reverse, len and    #
+# indexing, and a slice comes back as a list.                                     #
+################################################################################'''
+class ScanLine:
+    def __init__(self, point, pixels):
+        self.point = point
+        self.pixels = pixels
+
+    def __iter__(self):
+        return map(self.point, self.pixels)
+
+    def __len__(self):
+        return len(self.pixels)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self.point(i) for i in self.pixels[k]]
+        return self.point(self.pixels[k])
+
+    def reverse(self):
+        self.pixels = self.pixels[::-1]
+
 class Convert_Scan_Alternating:
     def __init__(self):
         self.st = 0
@@ -2554,7 +4248,10 @@ def progress(a, b, START_TIME, GUI=[]):
 class Converter:
     def __init__(self, BIG, image, units, tool_shape, pixelsize, pixelstep, safetyheight, tolerance, feed, \
                  convert_rows, convert_cols, cols_first_flag, border, entry_cut, roughing_delta, roughing_feed, \
-                 xoffset, yoffset, splitstep, header, postscript, edge_offset, disable_arcs):
+                 xoffset, yoffset, splitstep, header, postscript, edge_offset, disable_arcs, \
+                 adaptive=False, processes=1, window=0, clearance=0, link_dist=0,
+                 order_time=0, stock=None, scallop_slope=False, feed_max=1.0, rest_min=0,
+                 waterline=0, stats=None, spiral=0):
         self.BIG = BIG
         self.image = image
         self.units = units
@@ -2574,6 +4271,23 @@ class Converter:
         self.border = border
         self.edge_offset = edge_offset
         self.disable_arcs = disable_arcs
+        self.adaptive = adaptive
+        self.processes = processes
+        self.window = window
+        self.clearance = clearance
+        self.link_dist = link_dist
+        self.order_time = order_time
+        self.stock = stock
+        self.scallop_slope = scallop_slope
+        self.feed_max = feed_max
+        self.rest_min = rest_min
+        self.waterline = waterline
+        self.stats = stats
+        self.spiral = spiral
+        self.heights = None
+        self.stock_heights = None
+        self.pool = None
+        self.air_top = None
         self.xoffset = xoffset
         self.yoffset = yoffset
         splitpixels = 0
@@ -2582,7 +4296,17 @@ class Converter:
             splitpixels = int(floor(pixelstep * splitstep    ))
         self.pixelstep   = pixelstep
         self.splitpixels = splitpixels
+        self.cusp = cusp_height(tool_shape, pixelstep)
+        self.reach = (tool_shape.width - 1) // 2 + (pixelstep + 1) // 2
+        # with Cut Top off nothing the tool would leave above this is cut
+        self.top_skip = None
+        for convert_scan in (convert_rows, convert_cols):
+            if isinstance(convert_scan, Reduce_Scan_Lace_new):
+                self.top_skip = convert_scan.depth
         self.cache = {}
+        self.stock_cache = {}
+        self.entry_radii = {}
+        self.entry_level = None
         w, h = self.w, self.h = image.shape
         self.h1 = h
         self.w1 = w
@@ -2594,6 +4318,8 @@ class Converter:
         col_cnt = 0
         if self.convert_cols != None:
             col_cnt = ceil( self.h1 / pixelstep) + 2
+        if self.waterline or self.spiral:
+            row_cnt = 1
         if self.roughing_delta != 0:
             cnt_mult = ceil(self.image.min() / -self.roughing_delta) + 1
         else:
@@ -2603,9 +4329,27 @@ class Converter:
         self.cnt_total = (row_cnt + col_cnt + cnt_border )* cnt_mult
         self.cnt = 0.0
 
+    def __getstate__(self):
+        ''' the copy sent to worker processes leaves the GUI and the G-code
+            output behind '''
+        state = self.__dict__.copy()
+        for key in ('BIG', 'g', 'pool', 'cache', 'stock_cache', 'stats', 'entry_radii', 'flush_target'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.BIG = None
+        self.pool = None
+        self.cache = {}
+        self.stock_cache = {}
+        self.entry_radii = {}
+
     def one_pass(self):
         g = self.g
         g.set_feed(self.feed)
+        if self.feed_max > 1.0:
+            g.feed_range = (self.feed, self.feed * self.feed_max)
         if self.convert_cols and self.cols_first_flag:
             self.g.set_plane(19)
             self.mill_cols(self.convert_cols, True)
@@ -2617,6 +4361,12 @@ class Converter:
             self.g.set_plane(19)
             if self.convert_rows: g.safety()
             self.mill_cols(self.convert_cols, not self.convert_rows)
+        if self.waterline:
+            self.g.set_plane(17)
+            self.mill_waterline()
+        if self.spiral:
+            self.g.set_plane(17)
+            self.mill_spiral()
         g.safety()
         if self.convert_cols:
             self.convert_cols.reset()
@@ -2641,35 +4391,233 @@ class Converter:
             self.convert_rows.reset()
         g.safety()
 
-    def convert(self):
+    def convert(self, target=None):
+        ''' the G-code as a list of lines, or an empty list when 'target' is
+            given and takes the lines one at a time as they are made.  A target
+            with a flush method, like a GcodeFile, is flushed after the header,
+            after each pass and at the end. '''
         output_gcode = []
+        if target is None:
+            target = output_gcode.append
+        self.flush_target = getattr(target, 'flush', None)
         self.g = g = Gcode(safetyheight=self.safetyheight,
                            tolerance=self.tolerance,
                            units=self.units,
                            header=self.header,
                            postscript=self.postscript, 
-                           target=lambda s: output_gcode.append(s),
-                           disable_arcs = self.disable_arcs)
+                           target=target,
+                           disable_arcs = self.disable_arcs,
+                           window = self.window,
+                           stats = self.stats)
         g.begin()
         g.safety()
+        if self.flush_target:
+            self.flush_target()
+        if self.roughing_delta or self.stock is not None:
+            self.air_tiles()
+        if self.processes > 1:
+            self.pool = multiprocessing.Pool(self.processes, scan_worker_init, (copy.copy(self),))
+        try:
+            self.convert_passes()
+        finally:
+            if self.pool:
+                self.pool.terminate()
+                self.pool = None
+        g.end()
+        if self.flush_target:
+            self.flush_target()
+        return output_gcode
 
+    def convert_passes(self):
         if self.roughing_delta:
             self.feed = self.roughing_feed
+            self.levels = []
             r = -self.roughing_delta
             m = self.image.min()
             while r > m:
-                self.rd = r
-                self.one_pass()
+                self.levels.append(r)
                 r = r - self.roughing_delta
             if r < m + epsilon:
-                self.rd = m
-                self.one_pass()
+                self.levels.append(m)
         else:
             self.feed = self.base_feed
-            self.rd = self.image.min()
+            self.levels = [self.image.min()]
+        self.level_lines = {}
+        tops = [None] * len(self.levels)
+        if self.stock is not None:
+            tops[0] = 0.0
+        if self.roughing_delta:
+            tops[1:] = self.levels[:-1]
+        # a level with nothing to cut in any tile is left out altogether
+        self.passes = []
+        for level, (rd, top) in enumerate(zip(self.levels, tops)):
+            self.rd = rd
+            self.air_top = top
+            if top is None or any(self.tile_cuts(t) for tiles in self.air_rows for t in tiles):
+                self.passes.append((level, rd, top))
+        for n, (level, rd, top) in enumerate(self.passes):
+            self.pass_no = n
+            self.level = level
+            self.rd = rd
+            self.air_top = top
             self.one_pass()
-        g.end()
-        return output_gcode
+            if self.flush_target:
+                self.flush_target()
+
+    '''################################################################################
+    # Tables for leaving out what there is nothing to cut in.  The compensated        #
+    # surface at a pixel is never below the image there minus the tool center, so     #
+    # where that is at or above the level above this one the tool would only follow   #
+    # the surface that level left.  Nor does the tool at a pixel touch stock higher   #
+    # than the highest stock under it less the lowest point of the tool, so where     #
+    # that is at or below this level there is nothing left to cut.  Each row and each #
+    # column is split into tiles one tool diameter long and each tile keeps the       #
+    # minimum of the first bound and the maximum of the second over it as a pair in   #
+    # air_rows[j] and air_cols[j].                                                    #
+    ################################################################################'''
+    def air_tiles(self):
+        ts = self.tool_shape.width
+        c = (ts - 1) // 2
+        center = float(self.tool_shape(c, c))
+        tile = self.air_tile = ts
+        w1 = self.w1
+        h1 = self.h1
+        if NUMPY:
+            to = self.image.t_offset
+            low = self.image.matrix[to:to+w1, to:to+h1] - center
+            high = numpy.full((w1, h1), 1e1000000)
+            if self.stock is not None:
+                sw = numpy.lib.stride_tricks.sliding_window_view
+                S = self.stock.matrix
+                high = sw(sw(S, ts, axis=1).max(axis=-1), ts, axis=0).max(axis=-1) - float(self.tool_shape.matrix.min())
+            def tiles(a, pad, reduce):
+                n = -(-a.shape[1] // tile)
+                a = numpy.pad(a, ((0, 0), (0, n * tile - a.shape[1])), constant_values=pad)
+                return reduce(a.reshape(a.shape[0], n, tile), axis=2).tolist()
+            def pairs(low, high):
+                return [list(zip(lo, hi)) for lo, hi in
+                        zip(tiles(low, numpy.inf, numpy.min), tiles(high, -numpy.inf, numpy.max))]
+            self.air_rows = pairs(low, high)
+            self.air_cols = pairs(low.T, high.T)
+        else:
+            low = [[self.image(j, i) - center for i in range(h1)] for j in range(w1)]
+            high = [[1e1000000] * h1 for j in range(w1)]
+            if self.stock is not None:
+                tmin = min(min(row) for row in self.tool_shape.matrix)
+                S = self.stock.matrix
+                across = [[max(S[j][max(0, i-c):i+c+1]) for i in range(h1)] for j in range(w1)]
+                high = [[max(across[jj][i] for jj in range(max(0, j-c), min(w1, j+c+1))) - tmin
+                         for i in range(h1)] for j in range(w1)]
+            def pairs(low, high):
+                return [[(min(lo[k:k+tile]), max(hi[k:k+tile])) for k in range(0, len(lo), tile)]
+                        for lo, hi in zip(low, high)]
+            self.air_rows = pairs(low, high)
+            self.air_cols = pairs([[line[i] for line in low] for i in range(h1)],
+                                  [[line[i] for line in high] for i in range(h1)])
+
+    def tile_cuts(self, t):
+        ''' True when the tile with the bounds 't' may have something to cut
+            between air_top and this level, more than rest_min of it '''
+        return t[0] < self.air_top and t[1] > self.rd and t[1] > t[0] + self.rest_min
+
+    def material_range(self, cols, j, irange):
+        ''' 'irange' less the tiles at either end of line j that have nothing
+            to cut, empty when nothing is left '''
+        top = self.air_top
+        if top is None or not irange:
+            return irange
+        tiles = self.air_cols[j] if cols else self.air_rows[j]
+        tile = self.air_tile
+        lo = irange[0]
+        hi = irange[-1]
+        while lo <= hi and not self.tile_cuts(tiles[lo // tile]):
+            lo = (lo // tile + 1) * tile
+        while hi >= lo and not self.tile_cuts(tiles[hi // tile]):
+            hi = hi // tile * tile - 1
+        return range(lo, hi + 1)
+
+    '''################################################################################
+    # Split the spans of line j from the scan converter so that only the parts that   #
+    # remove material are cut.  Tiles with nothing to cut are left out first,         #
+    # then each point of the rest is checked against the cut_height the levels above  #
+    # left there.  Runs of points that cut are kept with one point more at either end #
+    # so the tool gets down to them along the surface, and runs less than a tile      #
+    # apart are kept as one.  A span that loses its start is entered afresh, the      #
+    # others keep their flag.                                                         #
+    ################################################################################'''
+    def trim_air(self, cols, j, spans):
+        top = self.air_top
+        if top is None:
+            yield from spans
+            return
+        tiles = self.air_cols[j] if cols else self.air_rows[j]
+        tile = self.air_tile
+        if cols:
+            height = lambda i: self.cut_height(j, i)
+        else:
+            height = lambda i: self.cut_height(i, j)
+        for flag, span in spans:
+            if isinstance(span, ScanLine):
+                pixels = span.pixels
+            else:
+                pixels = [p[0] for p in span]
+            cut = [self.tile_cuts(tiles[i // tile]) for i in pixels]
+            pieces = []
+            a = None
+            for k, c in enumerate(cut + [False]):
+                if c and a is None:
+                    a = k
+                elif not c and a is not None:
+                    points = span[a:k]
+                    runs = []
+                    for n, p in enumerate(points):
+                        if p[1][2] + self.rest_min < height(p[0]):
+                            if runs and (runs[-1][1] == n - 1 or abs(p[0] - points[runs[-1][1]][0]) <= tile):
+                                runs[-1][1] = n
+                            else:
+                                runs.append([n, n])
+                    for r0, r1 in runs:
+                        r0 = max(r0 - 1, 0)
+                        pieces.append((a + r0, points[r0:r1+2]))
+                    a = None
+            if len(pieces) == 1 and len(pieces[0][1]) == len(pixels):
+                yield flag, span
+                continue
+            for start, points in pieces:
+                yield (flag if start == 0 else True), points
+
+    def cut_height(self, x, y):
+        ''' the height the tool center has been down to at pixel (x, y) by the
+            levels above this one, their compensated surface but no lower than
+            air_top, or the height it touches the stock at when that is lower '''
+        try:
+            d = self.cache[x,y]
+        except KeyError:
+            self.cache[x,y] = d = self.image.height_calc(x,y,self.tool_shape)
+        d = min(0.0, max(self.air_top, d))
+        if self.stock is not None:
+            try:
+                d = min(d, self.stock_cache[x,y])
+            except KeyError:
+                self.stock_cache[x,y] = s = self.stock.height_calc(x,y,self.tool_shape)
+                d = min(d, s)
+        return d
+
+    def engagement(self, cols, j, p):
+        ''' the part of a full cut the cut to point p on line j takes for planned
+            feeds: the depth of material over it as a part of one roughing level,
+            all of it when finishing '''
+        if self.feed_max <= 1.0:
+            return None
+        if not self.roughing_delta:
+            return 1.0
+        if self.air_top is None:
+            top = 0.0
+        elif cols:
+            top = self.cut_height(j, p[0])
+        else:
+            top = self.cut_height(p[0], j)
+        return float(min(1.0, max(0.0, (top - p[1][2]) / self.roughing_delta)))
 
     def get_z(self, x, y):
         try:
@@ -2678,6 +4626,144 @@ class Converter:
             self.cache[x,y] = d = self.image.height_calc(x,y,self.tool_shape)
             return min(0.0, max(self.rd, d))
 
+    '''################################################################################
+    # The highest the material can still be anywhere under the tool on 'path' in this #
+    # pass below the first level.  The levels above cut down to the compensated       #
+    # surface but no lower than the level above this one.  Between their scanlines    #
+    # they left ridges as high as a cut half a step away plus the cusp, and up to     #
+    # 'tolerance' from the simplification on top of that, so every cut within         #
+    # 'reach' of the path counts.  Where Cut Top left the surface uncut the material  #
+    # is still at the top.                                                            #
+    ################################################################################'''
+    def material_top(self, path):
+        r = self.reach
+        rows = {}
+        for i, j in path:
+            for y in range(max(j - r, 0), min(j + r, self.w1 - 1) + 1):
+                lo, hi = rows.get(y, (i, i))
+                rows[y] = (min(lo, i), max(hi, i))
+        d = -1e1000000
+        for y, (lo, hi) in rows.items():
+            for x in range(max(lo - r, 0), min(hi + r, self.h1 - 1) + 1):
+                try:
+                    dx = self.cache[x,y]
+                except KeyError:
+                    self.cache[x,y] = dx = self.image.height_calc(x,y,self.tool_shape)
+                if dx > d:
+                    d = dx
+        if self.top_skip is not None and d >= self.top_skip:
+            return 0.0
+        return min(0.0, max(self.levels[self.level-1], d) + self.cusp + self.tolerance)
+
+    '''################################################################################
+    # Retract before a rapid move to (x, y).  The tool only has to clear the          #
+    # material under the straight path from where it is to (x, y), so it goes up to   #
+    # the material_top of that path plus 'clearance', never higher than the           #
+    # safety height.  With no clearance set, or when the tool position is unknown or  #
+    # either end is off the image, it goes to the safety height.                      #
+    ################################################################################'''
+    def retract(self, x, y):
+        g = self.g
+        g.flush()
+        path = None
+        if self.clearance > 0:
+            path = self.path_pixels(g.lastx, g.lasty, x, y)
+        if path is None:
+            g.safety()
+            return
+        if self.level == 0 or self.cusp is None:
+            # nothing is cut below the top yet, or the scanlines are too far
+            # apart for the tool to take the ridges between them
+            top = 0.0
+        else:
+            top = self.material_top(path)
+        z = min(top + self.clearance, self.safetyheight)
+        if z > g.lastz:
+            g.rapid(z=z)
+
+    def path_pixels(self, x0, y0, x1, y1):
+        ''' the pixels (i, j) on the straight path from (x0, y0) to (x1, y1), or
+            None when an end is unknown or off the image '''
+        if x0 is None or y0 is None:
+            return None
+        i0, j0 = self.pixel(x0, y0)
+        i1, j1 = self.pixel(x1, y1)
+        for i, j in ((i0, j0), (i1, j1)):
+            if i < 0 or i >= self.h1 or j < 0 or j >= self.w1:
+                return None
+        n = max(abs(i1 - i0), abs(j1 - j0), 1)
+        return [(i0 + int(round((i1 - i0) * k / n)), j0 + int(round((j1 - j0) * k / n)))
+                for k in range(n + 1)]
+
+    def pixel(self, x, y):
+        ''' the pixel (i, j) nearest to (x, y) '''
+        pixelsize = self.pixelsize
+        return (int(round((x - self.xoffset) / pixelsize)),
+                self.w1 - 1 - int(round((y - self.yoffset) / pixelsize)))
+
+    def overlaps_span(self, path, points):
+        ''' True when 'path' runs onto the line of the span 'points' ahead of
+            its start, where the link would cut the span in its own direction
+            first (the wrong one for Up Mill and Down Mill) '''
+        if len(points) < 2:
+            return False
+        i0, j0 = self.pixel(*points[0][1][:2])
+        i1, j1 = self.pixel(*points[1][1][:2])
+        di, dj = i1 - i0, j1 - j0
+        for i, j in path:
+            if dj == 0 and j == j0 and (i - i0) * di > 0:
+                return True
+            if di == 0 and i == i0 and (j - j0) * dj > 0:
+                return True
+        return False
+
+    '''################################################################################
+    # Start the span 'points' with a stay-down link if the tool can get there by      #
+    # feeding along the compensated surface, otherwise with the entry cut.  A link    #
+    # needs the tool to be down on the surface where the last span ended, a path no   #
+    # longer than 'link_dist' and no point on the path higher than the higher of its  #
+    # two ends, so links run across valleys and gaps but never climb over what the    #
+    # scan converter left out.  Nor may the path run along the span it leads to, as   #
+    # the link would then cut it backwards, so with Up Mill and Down Mill a span      #
+    # reversed to keep the milling direction is entered the usual way.  The link is   #
+    # simplified on its own so that it comes out the same whether the spans were      #
+    # scanned here or in a worker process.                                            #
+    ################################################################################'''
+    def entry(self, i0, j0, points):
+        g = self.g
+        g.flush()
+        x, y, z = points[0][1]
+        path = None
+        if self.link_dist > 0 and g.lastx is not None and g.lasty is not None \
+           and hypot(x - g.lastx, y - g.lasty) <= self.link_dist:
+            path = self.path_pixels(g.lastx, g.lasty, x, y)
+        if path is not None:
+            zs = [self.get_z(i, j) for i, j in path]
+            if abs(zs[0] - g.lastz) > self.tolerance or \
+               max(zs) > max(zs[0], zs[-1]) + self.tolerance or \
+               self.overlaps_span(path, points):
+                path = None
+        if path is None:
+            self.entry_cut(self, i0, j0, points)
+            return
+        pixelsize = self.pixelsize
+        engage = 1.0 if self.feed_max > 1.0 else None
+        for (i, j), zp in zip(path[1:-1], zs[1:-1]):
+            g.cut(i * pixelsize + self.xoffset, (self.w1-j-1) * pixelsize + self.yoffset, zp, engage)
+        g.cut(x, y, z, engage)
+        g.flush()
+
+    def join(self, i0, j0, points):
+        ''' carry on into the span 'points' from the line before as the scan
+            converter meant, unless leaving out air has moved the tool further
+            away than a stepover, then enter it '''
+        g = self.g
+        g.flush()
+        x, y = points[0][1][:2]
+        if g.lastx is None or g.lasty is None or \
+           hypot(x - g.lastx, y - g.lasty) > self.pixelstep * self.pixelsize + epsilon:
+            self.entry(i0, j0, points)
+
     def get_dz_dy(self, x, y):
         y1 = max(0, y-1)
         y2 = min(self.image.shape[0]-1, y+1)
@@ -2698,34 +4784,204 @@ class Converter:
             i += step
         return out
 
+    '''################################################################################
+    # The scanlines from 'start' up to 'stop', 'pixelstep' apart.  With scallop_slope #
+    # each line comes closer to the one before where the image is steep across the    #
+    # lines: a ball on a face sloped at 'a' leaves the scallop of a flat cut when the #
+    # lines are cos(a) times as far apart.  The compensated surface is never steeper  #
+    # than the image, so the image slope is a safe bound for it.                      #
+    ################################################################################'''
+    def scan_lines(self, cols, start, stop, border_flag=False):
+        pixelstep = self.pixelstep
+        if not self.scallop_slope or border_flag or self.splitpixels:
+            return self.frange(start, stop, pixelstep)
+        slopes = self.across_slopes(cols)
+        out = []
+        j = start
+        while j < stop:
+            out.append(j)
+            step = pixelstep
+            while step > 1:
+                m = max(slopes[j:j+step] or [0.0])
+                fit = max(1, int(pixelstep / sqrt(1.0 + m*m)))
+                if fit >= step:
+                    break
+                step = fit
+            j += step
+        return out
+
+    # the steepest image slope between each line and the next
+    def across_slopes(self, cols):
+        w1 = self.w1
+        h1 = self.h1
+        if NUMPY:
+            to = self.image.t_offset
+            M = self.image.matrix[to:to+w1, to:to+h1]
+            if cols:
+                M = M.T
+            return (numpy.abs(numpy.diff(M, axis=0)).max(axis=1) / self.pixelsize).tolist()
+        if cols:
+            return [max(abs(self.image(i, j+1) - self.image(i, j)) for i in range(w1)) / self.pixelsize
+                    for j in range(h1-1)]
+        return [max(abs(self.image(j+1, i) - self.image(j, i)) for i in range(h1)) / self.pixelsize
+                for j in range(w1-1)]
+
+    '''################################################################################
+    # Choose the pixels of 'irange' to sample on row (or column) j.  Without adaptive #
+    # sampling that is every pixel.  With it the line is sampled every half tool      #
+    # diameter and an interval is split in two until the surface at its quarter       #
+    # points and midpoint is within 'tolerance' of the straight line between its      #
+    # ends.  So that a narrow valley between those points is not stepped over, the    #
+    # surface is also checked where a lower bound of it that is cheap to get is       #
+    # lowest: the image under the tool center, or with NumPy the image along the      #
+    # middle row and column of the footprints minus the tool there.  The intervals    #
+    # are split a round at a time so that with NumPy the surface at the pixels each   #
+    # round needs comes from one call to fill_line.  Only those pixels, and the       #
+    # neighbours of the samples that the slopes are taken from, are ever evaluated.   #
+    ################################################################################'''
+    def scan_range(self, cols, j, irange):
+        if not self.adaptive or len(irange) < 3:
+            return irange
+        i0 = irange[0]
+        tolerance = self.tolerance
+        c = (self.tool_shape.width - 1) // 2
+        if NUMPY:
+            T = self.tool_shape.matrix
+            M = self.image.matrix
+            if cols:
+                M, T = M.T, T.T
+            ts = T.shape[0]
+            end = irange[-1] + ts
+            row = numpy.lib.stride_tricks.sliding_window_view(M[j+c, i0:end], ts) - T[c]
+            col = M[j:j+ts, i0+c:end-c] - T[:, c, None]
+            floor = numpy.maximum(row.max(axis=1), col.max(axis=0)).tolist()
+        elif cols:
+            center = self.tool_shape(c, c)
+            floor = [self.image(i, j) - center for i in irange]
+        else:
+            center = self.tool_shape(c, c)
+            floor = [self.image(j, i) - center for i in irange]
+        if cols:
+            z_at = lambda i: self.get_z(j, i)
+        else:
+            z_at = lambda i: self.get_z(i, j)
+        def inner(a, b):
+            ''' the pixels between a and b the surface is checked at '''
+            m = (a + b) // 2
+            low = floor[a+1-i0:b-i0]
+            return a, b, {(a + m) // 2, m, (m + b) // 2, a + 1 + low.index(min(low))}
+        step = max(2, (self.tool_shape.width - 1) // 2)
+        coarse = list(irange[::step])
+        if coarse[-1] != irange[-1]:
+            coarse.append(irange[-1])
+        samples = list(coarse)
+        spans = [inner(a, b) for a, b in zip(coarse, coarse[1:]) if b - a > 1]
+        self.fill_line(cols, j, coarse)
+        while spans:
+            self.fill_line(cols, j, {i for a, b, pixels in spans for i in pixels})
+            split = []
+            for a, b, pixels in spans:
+                za = z_at(a)
+                dz = (z_at(b) - za) / (b - a)
+                if any(abs(z_at(i) - (za + dz * (i - a))) > tolerance for i in pixels):
+                    m = (a + b) // 2
+                    samples.append(m)
+                    split += [(a, m), (m, b)]
+            spans = [inner(a, b) for a, b in split if b - a > 1]
+        samples.sort()
+        # the pixels get_dz_dx and get_dz_dy look at
+        along = self.image.shape[0 if cols else 1]
+        across = self.image.shape[1 if cols else 0]
+        self.fill_line(cols, j, {k for i in samples for k in (i-1, i+1) if 0 <= k < along})
+        for jj in (j-1, j+1):
+            if 0 <= jj < across:
+                self.fill_line(cols, jj, samples)
+        return samples
+
+    '''################################################################################
+    # The compensated surface at the pixels 'idx' of row (or column) j as a float32   #
+    # array.  Each value is the maximum of the image minus the tool over the tool's   #
+    # footprint as in Image_Matrix_Numpy.height_calc, so the values are the same, but #
+    # the footprints of many pixels are gathered into one array operation.            #
+    ################################################################################'''
+    def line_heights(self, cols, j, idx):
+        T = self.tool_shape.matrix
+        win = numpy.lib.stride_tricks.sliding_window_view(self.image.matrix, T.shape)
+        win = win[:, j] if cols else win[j]
+        step = max(1, (1 << 20) // T.size)
+        return numpy.concatenate([(win[idx[k:k+step]] - T).max(axis=(1, 2))
+                                  for k in range(0, len(idx), step)])
+
+    def fill_line(self, cols, j, pixels):
+        ''' with NumPy, cache the surface at those of 'pixels' on line j that
+            are not cached yet in one call to line_heights, without it they
+            are left to get_z '''
+        if not NUMPY:
+            return
+        if cols:
+            missing = sorted(i for i in pixels if (j, i) not in self.cache)
+        else:
+            missing = sorted(i for i in pixels if (i, j) not in self.cache)
+        if not missing:
+            return
+        for i, z in zip(missing, self.line_heights(cols, j, numpy.array(missing))):
+            if cols:
+                self.cache[j, i] = z
+            else:
+                self.cache[i, j] = z
+
+    def row_points(self, j, irange):
+        ''' the compensated surface along row j as a ScanLine of
+            (i, (x, y, z), dz/dx, dz/dy) '''
+        pixelsize = self.pixelsize
+        y = (self.w1-j-1) * pixelsize + self.yoffset
+        def point(i):
+            return (i, (i * pixelsize + self.xoffset, y, self.get_z(i, j)),
+                    self.get_dz_dx(i, j), self.get_dz_dy(i, j))
+        return ScanLine(point, self.scan_range(False, j, irange))
+
+    def col_points(self, j, irange):
+        ''' the compensated surface along column j as a ScanLine of
+            (i, (x, y, z), dz/dy, dz/dx) '''
+        pixelsize = self.pixelsize
+        x = j * pixelsize + self.xoffset
+        def point(i):
+            return (i, (x, (self.w1-i-1) * pixelsize + self.yoffset, self.get_z(j, i)),
+                    self.get_dz_dy(j, i), self.get_dz_dx(j, i))
+        return ScanLine(point, self.scan_range(True, j, irange))
+
     def mill_rows(self, convert_scan, primary, border_flag=False):
         global STOP_CALC
         w1 = self.w1
         h1 = self.h1
         pixelsize = self.pixelsize
-        pixelstep = self.pixelstep
         pixel_offset = int(ceil(self.edge_offset / pixelsize))
-        jrange = self.frange(self.splitpixels+pixel_offset, w1-pixel_offset, pixelstep)
+        jrange = self.scan_lines(False, self.splitpixels+pixel_offset, w1-pixel_offset, border_flag)
         if jrange[0] != pixel_offset: jrange.insert(0,pixel_offset)
         if w1-1-pixel_offset not in jrange: jrange.append(w1-1-pixel_offset)
         irange = range(pixel_offset,h1-pixel_offset)
+        if self.pool:
+            self.mill_parallel(False, convert_scan, primary, border_flag, jrange, irange)
+            return
+        if self.order_time > 0:
+            self.mill_ordered(False, convert_scan, primary, border_flag, jrange, irange)
+            return
         for j in jrange:
             self.cnt = self.cnt+1
             progress(self.cnt, self.cnt_total, self.START_TIME, self.BIG )
-            y = (w1-j-1) * pixelsize + self.yoffset
-            scan = []
-            for i in irange:
-                self.BIG.update()
-                if STOP_CALC: return
-                x = i * pixelsize + self.xoffset
-                milldata = (i, (x, y, self.get_z(i, j)),
-                            self.get_dz_dx(i, j), self.get_dz_dy(i, j))
-                scan.append(milldata)
-            for flag, points in convert_scan(primary, scan):
+            span_range = self.material_range(False, j, irange)
+            if not span_range:
+                for flag, points in convert_scan(primary, []): pass
+                continue
+            for flag, points in self.trim_air(False, j, convert_scan(primary, self.row_points(j, span_range))):
                 if flag or border_flag:
-                    self.entry_cut(self, points[0][0], j, points)
+                    self.entry(points[0][0], j, points)
+                elif self.air_top is not None:
+                    self.join(points[0][0], j, points)
                 for p in points:
-                    self.g.cut(*p[1])
+                    self.BIG.update()
+                    if STOP_CALC: return
+                    self.g.cut(*p[1], engage=self.engagement(False, j, p))
             self.g.flush()
 
     def mill_cols(self, convert_scan, primary, border_flag=False):
@@ -2733,35 +4989,659 @@ class Converter:
         w1 = self.w1
         h1 = self.h1
         pixelsize = self.pixelsize
-        pixelstep = self.pixelstep
         pixel_offset = int(ceil(self.edge_offset / pixelsize))
-        jrange = self.frange(self.splitpixels+pixel_offset, h1-pixel_offset, pixelstep)
+        jrange = self.scan_lines(True, self.splitpixels+pixel_offset, h1-pixel_offset, border_flag)
         if jrange[0] != pixel_offset: jrange.insert(0,pixel_offset)
         if h1-1-pixel_offset not in jrange: jrange.append(h1-1-pixel_offset)
         irange = range(pixel_offset,w1-pixel_offset)
         if h1-1-pixel_offset not in jrange: jrange.append(h1-1-pixel_offset)
         jrange.reverse()
+        if self.pool:
+            self.mill_parallel(True, convert_scan, primary, border_flag, jrange, irange)
+            return
+        if self.order_time > 0:
+            self.mill_ordered(True, convert_scan, primary, border_flag, jrange, irange)
+            return
         for j in jrange:
             self.cnt = self.cnt+1
             progress(self.cnt, self.cnt_total, self.START_TIME, self.BIG )
-            x = j * pixelsize + self.xoffset
-            scan = []
-            for i in irange:
-                self.BIG.update()
-                if STOP_CALC: return
-                y = (w1-i-1) * pixelsize + self.yoffset
-                milldata = (i, (x, y, self.get_z(j, i)),
-                            self.get_dz_dy(j, i), self.get_dz_dx(j, i))
-                scan.append(milldata)
-            for flag, points in convert_scan(primary, scan):
+            span_range = self.material_range(True, j, irange)
+            if not span_range:
+                for flag, points in convert_scan(primary, []): pass
+                continue
+            for flag, points in self.trim_air(True, j, convert_scan(primary, self.col_points(j, span_range))):
                 if flag or border_flag:
-                    self.entry_cut(self, j, points[0][0], points)
+                    self.entry(j, points[0][0], points)
+                elif self.air_top is not None:
+                    self.join(j, points[0][0], points)
                 for p in points:
-                    self.g.cut(*p[1])
+                    self.BIG.update()
+                    if STOP_CALC: return
+                    self.g.cut(*p[1], engage=self.engagement(True, j, p))
             self.g.flush()
 
-def convert(*args, **kw):
-    return Converter(*args, **kw).convert()
+    def surface(self, image, cache):
+        ''' the compensated surface of 'image' at every pixel, indexed [j][i],
+            an array with NumPy and a list of rows otherwise '''
+        w1 = self.w1
+        h1 = self.h1
+        tool = self.tool_shape
+        if NUMPY:
+            S = numpy.full((w1, h1), -numpy.inf, 'float32')
+            for a in range(tool.width):
+                for b in range(tool.width):
+                    if not isinf(tool.matrix[a, b]):
+                        numpy.maximum(S, image.matrix[a:a+w1, b:b+h1] - tool.matrix[a, b], out=S)
+            return S
+        rows = []
+        for j in range(w1):
+            row = []
+            for i in range(h1):
+                try:
+                    d = cache[i,j]
+                except KeyError:
+                    cache[i,j] = d = image.height_calc(i,j,tool)
+                row.append(d)
+            rows.append(row)
+        return rows
+
+    '''################################################################################
+    # Waterline roughing, the level cut as loops at its height instead of lines.  The #
+    # tool can be down at the level wherever the compensated surface is no higher,    #
+    # inside the edge offset and where there is stock to cut.  The first loops go     #
+    # round that region on the iso-contour of the surface at the level, and each set  #
+    # after them is one stepover further in, an iso-contour of the distance from the  #
+    # edge of the region.  See cut_loops for the order they are cut in.               #
+    ################################################################################'''
+    def mill_waterline(self):
+        w1 = self.w1
+        h1 = self.h1
+        pixelsize = self.pixelsize
+        rd = self.rd
+        self.cnt = self.cnt+1
+        progress(self.cnt, self.cnt_total, self.START_TIME, self.BIG )
+        if self.heights is None:
+            # the highest surface at and around each pixel, so the tool is
+            # clear of it at all four corners of any cell a loop goes through
+            H = self.surface(self.image, self.cache)
+            if NUMPY:
+                P = numpy.pad(H, 1, mode='edge')
+                for a in range(3):
+                    for b in range(3):
+                        numpy.maximum(H, P[a:a+w1, b:b+h1], out=H)
+            else:
+                H = [[max(H[y][x] for y in range(max(j-1, 0), min(j+2, w1))
+                          for x in range(max(i-1, 0), min(i+2, h1))) for i in range(h1)] for j in range(w1)]
+            self.heights = H
+            if self.stock is not None:
+                self.stock_heights = self.surface(self.stock, self.stock_cache)
+        H = self.heights
+        S = self.stock_heights
+        lo = int(ceil(self.edge_offset / pixelsize))
+        if NUMPY:
+            inside = numpy.zeros((w1, h1), bool)
+            inside[lo:w1-lo, lo:h1-lo] = True
+            inside &= H <= rd
+            if S is not None:
+                inside &= S > rd
+            F = numpy.where(inside, numpy.minimum(H - rd, -epsilon), numpy.where(H > rd, H - rd, 1.0))
+        else:
+            inside = [[lo <= j < w1-lo and lo <= i < h1-lo and H[j][i] <= rd and
+                       (S is None or S[j][i] > rd) for i in range(h1)] for j in range(w1)]
+            F = [[min(d - rd, -epsilon) if m else (d - rd if d > rd else 1.0)
+                  for d, m in zip(H[j], inside[j])] for j in range(w1)]
+        loops = [(0, pts) for pts in iso_loops(F)]
+        D = distance_field(inside)
+        top = float(D.max()) if NUMPY else max(max(row) for row in D)
+        k = 1
+        while k * self.pixelstep + 0.5 < top:
+            c = k * self.pixelstep + 0.5
+            if NUMPY:
+                F = c - D
+            else:
+                F = [[c - d for d in row] for row in D]
+            loops.extend((k, pts) for pts in iso_loops(F))
+            k += 1
+        # to machine coordinates, the first loops kept inside the edge offset
+        xoffset = self.xoffset
+        yoffset = self.yoffset
+        loops = [(k, [(min(max(i, lo), h1-1-lo) * pixelsize + xoffset,
+                       (w1 - 1 - min(max(j, lo), w1-1-lo)) * pixelsize + yoffset, rd) for i, j in pts])
+                 for k, pts in loops]
+        self.cut_loops(loops, inside, False, self.waterline == 2)
+
+    '''################################################################################
+    # Spiral finishing, offset contours of the part instead of lines.  The part is    #
+    # where the compensated surface stands above the floor of the image, taken with   #
+    # the floor a tool radius round it.  The first loops go round its edge and each   #
+    # set after them is one stepover further in, an iso-contour of the distance from  #
+    # the edge.  The surface between pixel centers is interpolated from the four      #
+    # round it, as a scanline is between its samples.  The loops are cut from the     #
+    # outside in, see cut_loops, feeding from one loop to the next across the         #
+    # surface, so a part with no holes in it is one continuous cut.                   #
+    ################################################################################'''
+    def mill_spiral(self):
+        w1 = self.w1
+        h1 = self.h1
+        pixelsize = self.pixelsize
+        rd = self.rd
+        self.cnt = self.cnt+1
+        progress(self.cnt, self.cnt_total, self.START_TIME, self.BIG )
+        H = self.surface(self.image, self.cache)
+        lo = int(ceil(self.edge_offset / pixelsize))
+        # the floor within a tool radius of the part goes with it, so its foot
+        # is cleaned up too
+        r = (self.tool_shape.width - 1) // 2
+        if NUMPY:
+            H = numpy.minimum(numpy.maximum(H, rd), 0.0)
+            part = H > rd + epsilon
+            if not part.any():
+                return
+            inside = numpy.zeros((w1, h1), bool)
+            inside[lo:w1-lo, lo:h1-lo] = True
+            inside &= part | (distance_field(~part) <= r)
+        else:
+            H = [[min(max(d, rd), 0.0) for d in row] for row in H]
+            part = [[d > rd + epsilon for d in row] for row in H]
+            if not any(any(row) for row in part):
+                return
+            near = distance_field([[not m for m in row] for row in part])
+            inside = [[lo <= j < w1-lo and lo <= i < h1-lo and (part[j][i] or near[j][i] <= r)
+                       for i in range(h1)] for j in range(w1)]
+        D = distance_field(inside)
+        top = float(D.max()) if NUMPY else max(max(row) for row in D)
+        loops = []
+        k = 0
+        # the loops run a hair outside the centers of the pixels they go
+        # through, so where they go straight they cut at the pixels' heights
+        while k * self.pixelstep + 1 - epsilon < top:
+            c = k * self.pixelstep + 1 - epsilon
+            if NUMPY:
+                F = c - D
+            else:
+                F = [[c - d for d in row] for row in D]
+            loops.extend((k, pts) for pts in iso_loops(F))
+            k += 1
+        def heights(pts):
+            ''' the surface at 'pts', (i, j) pixel positions '''
+            if NUMPY:
+                P = numpy.clip(numpy.array(pts), lo, (h1-1-lo, w1-1-lo))
+                i0 = numpy.minimum(P[:, 0].astype(int), h1-2-lo)
+                j0 = numpy.minimum(P[:, 1].astype(int), w1-2-lo)
+                fi = P[:, 0] - i0
+                fj = P[:, 1] - j0
+                return ((H[j0, i0] * (1 - fi) + H[j0, i0+1] * fi) * (1 - fj) +
+                        (H[j0+1, i0] * (1 - fi) + H[j0+1, i0+1] * fi) * fj).tolist()
+            zs = []
+            for i, j in pts:
+                i = min(max(i, lo), h1-1-lo)
+                j = min(max(j, lo), w1-1-lo)
+                i0 = min(int(i), h1-2-lo)
+                j0 = min(int(j), w1-2-lo)
+                fi = i - i0
+                fj = j - j0
+                zs.append((H[j0][i0] * (1 - fi) + H[j0][i0+1] * fi) * (1 - fj) +
+                          (H[j0+1][i0] * (1 - fi) + H[j0+1][i0+1] * fi) * fj)
+            return zs
+        xoffset = self.xoffset
+        yoffset = self.yoffset
+        def height(x, y):
+            ''' the same for a point (x, y) in machine coordinates '''
+            return heights([((x - xoffset) / pixelsize, w1 - 1 - (y - yoffset) / pixelsize)])[0]
+        loops = [(k, [(min(max(i, lo), h1-1-lo) * pixelsize + xoffset,
+                       (w1 - 1 - min(max(j, lo), w1-1-lo)) * pixelsize + yoffset, float(z))
+                      for (i, j), z in zip(pts, heights(pts))])
+                 for k, pts in loops]
+        # with the uncut part on the left of the cutter, down milling goes the
+        # other way round
+        self.cut_loops(loops, inside, True, self.spiral == 1, height)
+
+    '''################################################################################
+    # Cut the 'loops', (k, points) for the k-th set in from the edge of the region    #
+    # 'inside', from the inside out, or from the outside in when 'inward'.  A loop    #
+    # that goes round the region of its set counterclockwise is an outside edge of    #
+    # it, the others are the edges of the islands in it.  A part of the region, an    #
+    # outside loop with the islands in it, is cut once the parts of the next set in   #
+    # are, or the part of the set before it when inward.  Of the loops that are ready #
+    # the one that comes nearest to the tool is cut next, starting at that point.     #
+    # The tool feeds across to it if it is within two stepovers, or 'link_dist', and  #
+    # the path stays in the region, otherwise it is entered afresh.  The feed across  #
+    # is straight, or follows 'height' (x, y) when there is one.  The loops run with  #
+    # the region on the left of the cutter unless 'reverse'.                          #
+    ################################################################################'''
+    def cut_loops(self, loops, inside, inward=False, reverse=False, height=None):
+        global STOP_CALC
+        g = self.g
+        plan = [[(x, y) for x, y, z in pts] for k, pts in loops]
+        areas = [loop_area(pts) for pts in plan]
+        boxes = [(min(x for x, y in pts), min(y for x, y in pts),
+                  max(x for x, y in pts), max(y for x, y in pts)) for pts in plan]
+        outsides = {}
+        for n, (k, pts) in enumerate(loops):
+            if areas[n] > 0:
+                outsides.setdefault(k, []).append(n)
+        def container(n, k):
+            ''' the smallest outside loop of set k around loop n '''
+            x, y = plan[n][0]
+            best = None
+            for m in outsides.get(k, ()):
+                x0, y0, x1, y1 = boxes[m]
+                if m != n and x0 <= x <= x1 and y0 <= y <= y1 and \
+                   (best is None or areas[m] < areas[best]) and inside_loop((x, y), plan[m]):
+                    best = m
+            return best
+        part = {}
+        parent = {}
+        waiting = {}
+        children = {}
+        for n, (k, pts) in enumerate(loops):
+            if areas[n] > 0:
+                part[n] = n
+                if k > 0:
+                    parent[n] = container(n, k-1)
+                    if parent[n] is not None:
+                        waiting[parent[n]] = waiting.get(parent[n], 0) + 1
+                        children.setdefault(parent[n], []).append(n)
+            else:
+                c = container(n, k)
+                part[n] = n if c is None else c
+        todo = {}
+        for n in range(len(loops)):
+            todo.setdefault(part[n], []).append(n)
+        if inward:
+            ready = [c for c in todo if parent.get(c) is None]
+        else:
+            ready = [c for c in todo if not waiting.get(c)]
+        engage = 1.0 if self.feed_max > 1.0 else None
+        limit = max(self.link_dist, 2 * self.pixelstep * self.pixelsize)
+        down = False
+        while ready:
+            x = g.lastx if g.lastx is not None else self.xoffset
+            y = g.lasty if g.lasty is not None else self.yoffset
+            cands = sorted((hypot(max(b[0] - x, 0, x - b[2]), max(b[1] - y, 0, y - b[3])), n)
+                           for c in ready for n in todo[c] for b in (boxes[n],))
+            best = None
+            for d, n in cands:
+                if best is not None and d * d >= best[0]:
+                    break
+                for s, (px, py) in enumerate(plan[n][:-1]):
+                    d2 = (px - x) ** 2 + (py - y) ** 2
+                    if best is None or d2 < best[0]:
+                        best = (d2, n, s)
+            d2, n, s = best
+            pts = loops[n][1]
+            pts = pts[s:-1] + pts[:s+1]
+            if reverse:
+                pts.reverse()
+            x, y, z = pts[0]
+            path = None
+            if down and hypot(x - g.lastx, y - g.lasty) <= limit:
+                path = self.path_pixels(g.lastx, g.lasty, x, y)
+            if path is None or not all(inside[j][i] for i, j in path):
+                i, j = self.pixel(x, y)
+                SimpleEntryCut(self.entry_cut.feed)(self, i, j, [(i, (x, y, z))])
+            elif height is not None:
+                x0 = g.lastx
+                y0 = g.lasty
+                steps = int(ceil(hypot(x - x0, y - y0) / self.pixelsize))
+                for k in range(1, steps):
+                    xk = x0 + (x - x0) * k / steps
+                    yk = y0 + (y - y0) * k / steps
+                    g.cut(xk, yk, height(xk, yk), engage)
+            g.cut(x, y, z, engage)
+            # a closed loop would have no chord for douglas, so it goes out in halves
+            half = len(pts) // 2
+            for k, (x, y, z) in enumerate(pts[1:], 1):
+                self.BIG.update()
+                if STOP_CALC: return
+                g.cut(x, y, z, engage)
+                if k == half:
+                    g.flush()
+            g.flush()
+            down = True
+            c = part[n]
+            todo[c].remove(n)
+            if not todo[c]:
+                ready.remove(c)
+                if inward:
+                    ready.extend(children.get(c, ()))
+                    continue
+                p = parent.get(c)
+                if p is not None:
+                    waiting[p] -= 1
+                    if not waiting[p]:
+                        ready.append(p)
+
+    '''################################################################################
+    # Worker process side of mill_parallel.  Scan, convert and simplify the lines in  #
+    # 'block', which start at line number k of the pass.  The scan converter copy is  #
+    # first run over k empty lines so that its direction state (Alternating) matches  #
+    # what a serial run would have.  Each line comes back as a list of operations:    #
+    # ('entry', i, j, points) for an entry cut, ('join', i, j, points) for a span     #
+    # that only needs one when the tool is not next to it (see join) and ('moves',    #
+    # moves) for simplified moves.  The cuts go through a Gcode of their own so they  #
+    # are flushed the same way as in the parent.                                      #
+    # The block is done once for each (Z level, air_top) in 'levels', all from the    #
+    # same surface cache, and the lines come back as one list per level.              #
+    ################################################################################'''
+    def scan_block(self, cols, convert_scan, primary, border_flag, plane, levels, irange, k, block):
+        level_lines = []
+        for rd, top in levels:
+            self.rd = rd
+            self.air_top = top
+            level_scan = copy.deepcopy(convert_scan)
+            for n in range(k):
+                for flag, points in level_scan(primary, []): pass
+            level_lines.append([self.scan_line(cols, level_scan, primary, border_flag, plane, irange, j)
+                                for j in block])
+        return level_lines
+
+    def scan_line(self, cols, convert_scan, primary, border_flag, plane, irange, j):
+        ''' scan, convert and simplify line j into the operations described above '''
+        irange = self.material_range(cols, j, irange)
+        if not irange:
+            for flag, points in convert_scan(primary, []): pass
+            return []
+        if cols:
+            scan = self.col_points(j, irange)
+        else:
+            scan = self.row_points(j, irange)
+        ops = []
+        g = Gcode(tolerance=self.tolerance, window=self.window)
+        g.plane = plane
+        g.emit = lambda moves: ops.append(('moves', float_moves(moves)))
+        for flag, points in self.trim_air(cols, j, convert_scan(primary, scan)):
+            if flag or border_flag or self.air_top is not None:
+                g.flush()
+                op = 'entry' if flag or border_flag else 'join'
+                if cols:
+                    ops.append((op, j, points[0][0], points[:2]))
+                else:
+                    ops.append((op, points[0][0], j, points[:2]))
+            for p in points:
+                g.cut(*p[1], engage=self.engagement(cols, j, p))
+        g.flush()
+        return ops
+
+    '''################################################################################
+    # Hand blocks of scanlines to the worker processes and replay their results in    #
+    # scanline order.  Entry cuts are made here and the simplified moves go through   #
+    # Gcode.emit, so modal suppression sees exactly the sequence of a serial run.     #
+    # Every roughing level runs the same sequence of mill passes, so the first level  #
+    # has the workers do this pass for all remaining levels at once.  The lines of    #
+    # the deeper levels are kept in 'level_lines' and replayed when one_pass gets to  #
+    # them, which keeps the G-code in depth order.  With a simplify window each level #
+    # is done on its own instead, so memory stays bounded.                            #
+    ################################################################################'''
+    def mill_parallel(self, cols, convert_scan, primary, border_flag, jrange, irange):
+        global STOP_CALC
+        key = (cols, border_flag)
+        if self.level_lines.get(key):
+            lines = self.level_lines[key].pop(0)
+            if self.order_time > 0:
+                self.replay_ordered(lines)
+                return
+            for ops in lines:
+                self.BIG.update()
+                if STOP_CALC: return
+                self.replay(ops)
+            return
+        levels = [(rd, top) for level, rd, top in self.passes[self.pass_no:]]
+        if self.window:
+            # streaming, do not hold the deeper levels back
+            levels = levels[:1]
+        later = [[] for rd in levels[1:]]
+        self.level_lines[key] = later
+        size = max(1, len(jrange) // (4 * self.processes))
+        tasks = [(cols, convert_scan, primary, border_flag, self.g.plane, levels, irange, k, jrange[k:k+size])
+                 for k in range(0, len(jrange), size)]
+        lines = []
+        for level_lines in self.pool.imap(scan_worker, tasks):
+            for n, level in enumerate(level_lines[1:]):
+                later[n].extend(level)
+            for ops in level_lines[0]:
+                self.cnt = self.cnt+len(levels)
+                progress(self.cnt, self.cnt_total, self.START_TIME, self.BIG )
+                self.BIG.update()
+                if STOP_CALC: return
+                if self.order_time > 0:
+                    lines.append(ops)
+                else:
+                    self.replay(ops)
+        if lines:
+            self.replay_ordered(lines)
+
+    def replay(self, ops):
+        ''' make the entry cuts and moves that scan_block sent back for one line '''
+        for op in ops:
+            if op[0] == 'entry':
+                self.entry(op[1], op[2], op[3])
+            elif op[0] == 'join':
+                self.join(op[1], op[2], op[3])
+            else:
+                self.g.emit(op[1])
+
+    def mill_ordered(self, cols, convert_scan, primary, border_flag, jrange, irange):
+        ''' the serial counterpart of mill_parallel for span ordering, the whole
+            pass is scanned before any of it is cut '''
+        global STOP_CALC
+        lines = []
+        for j in jrange:
+            self.cnt = self.cnt+1
+            progress(self.cnt, self.cnt_total, self.START_TIME, self.BIG )
+            self.BIG.update()
+            if STOP_CALC: return
+            lines.append(self.scan_line(cols, convert_scan, primary, border_flag, self.g.plane, irange, j))
+        self.replay_ordered(lines)
+
+    '''################################################################################
+    # Replay the lines of one mill pass span by span in the order order_spans picks.  #
+    # A span is an entry operation and the moves up to the next one.  Moves before    #
+    # the first entry continue from where the tool is, so they stay first.            #
+    ################################################################################'''
+    def replay_ordered(self, lines):
+        global STOP_CALC
+        spans = []
+        for ops in lines:
+            for op in ops:
+                if op[0] == 'entry' or not spans:
+                    spans.append([])
+                spans[-1].append(op)
+        if spans and spans[0][0][0] != 'entry':
+            self.replay(spans.pop(0))
+        if not spans:
+            return
+        starts = []
+        ends = []
+        for span in spans:
+            starts.append(span[0][3][0][1][:2])
+            end = starts[-1]
+            for op in span[1:]:
+                if op[0] == 'moves' and op[1]:
+                    end = op[1][-1][1][:2]
+            ends.append(end)
+        origin = starts[0]
+        if self.g.lastx is not None and self.g.lasty is not None:
+            origin = (self.g.lastx, self.g.lasty)
+        for k in order_spans(starts, ends, origin, self.order_time):
+            self.BIG.update()
+            if STOP_CALC: return
+            self.replay(spans[k])
+
+def convert(*args, target=None, **kw):
+    return Converter(*args, **kw).convert(target)
+
+class QuietGUI:
+    ''' takes the progress messages and updates of a conversion that is
+        not shown '''
+    def __init__(self):
+        self.statusMessage = self
+
+    def set(self, message):
+        pass
+
+    def update(self):
+        pass
+
+def estimate_worker(args, BIG=None):
+    ''' convert for the MoveStats in 'args' and throw the G-code away '''
+    conv = Converter(BIG or QuietGUI(), *args)
+    conv.convert(lambda line: None)
+    return conv.stats
+
+def coarse_matrix(M, f):
+    ''' every f-th pixel of an unpadded image matrix, both ways '''
+    C = Image_Matrix()
+    C.From_Array([row[::f] for row in M.matrix[::f]])
+    return C
+
+''' simplified moves for the worker processes to send back, with plain float
+    coordinates '''
+def float_moves(moves):
+    return [(move, (float(x), float(y), float(z)), cent, engage)
+            for move, (x, y, z), cent, engage in moves]
+
+'''################################################################################
+# Order spans to cut down rapid travel.  Span k starts at starts[k] and ends at   #
+# ends[k], both (x, y), and is always cut in its own direction.  A nearest        #
+# neighbour tour from 'origin' is found with a grid of the span starts and then   #
+# improved with 2-opt moves until none helps or 'budget' seconds have passed.     #
+# A 2-opt move reverses the order a run of spans is visited in, not the spans     #
+# themselves, so the gaps inside a reversed run come from prefix sums of the      #
+# backward gaps.  Returns the span numbers in cutting order.                      #
+################################################################################'''
+def order_spans(starts, ends, origin, budget, neighbours=8):
+    t_end = time() + budget
+    n = len(starts)
+    if n < 2:
+        return list(range(n))
+
+    # no grid cell is smaller than the bounding box of everything the searches
+    # can be asked about allows, or rings of empty cells take forever to walk
+    xs = [p[0] for p in starts + ends + [origin]]
+    ys = [p[1] for p in starts + ends + [origin]]
+    w = max(xs) - min(xs)
+    h = max(ys) - min(ys)
+    min_cell = max(sqrt(w * h / n), (w + h) / n, epsilon)
+
+    def make_grid(spans):
+        ''' a grid of the starts of 'spans' with about one start per cell '''
+        xs = [starts[k][0] for k in spans]
+        ys = [starts[k][1] for k in spans]
+        w = max(xs) - min(xs)
+        h = max(ys) - min(ys)
+        cell = max(sqrt(w * h / len(spans)), (w + h) / len(spans), min_cell)
+        cells = {}
+        for k in spans:
+            cells.setdefault((int(floor(starts[k][0]/cell)), int(floor(starts[k][1]/cell))), set()).add(k)
+        kx = [c[0] for c in cells]
+        ky = [c[1] for c in cells]
+        return cells, cell, (min(kx), max(kx), min(ky), max(ky)), set(spans)
+
+    def nearest(grid, p, count):
+        ''' up to 'count' spans in 'grid' with the starts nearest p, nearest first.
+            Few spans, a far away p or a spent budget get a plain linear scan. '''
+        cells, cell, (x0, x1, y0, y1), spans = grid
+        cx = int(floor(p[0]/cell))
+        cy = int(floor(p[1]/cell))
+        rmax = max(cx-x0, x1-cx, cy-y0, y1-cy, 0)
+        found = []
+        r = 0
+        if len(spans) > 32:
+            rlimit = min(rmax, int(sqrt(len(spans))) + 1)
+            while r <= rlimit:
+                if r == 0:
+                    ring = [(cx, cy)]
+                else:
+                    ring = [(cx+d, cy-r) for d in range(-r, r+1)] + [(cx+d, cy+r) for d in range(-r, r+1)] + \
+                           [(cx-r, cy+d) for d in range(1-r, r)] + [(cx+r, cy+d) for d in range(1-r, r)]
+                for c in ring:
+                    for k in cells.get(c, ()):
+                        found.append((hypot(starts[k][0]-p[0], starts[k][1]-p[1]), k))
+                found.sort()
+                if len(found) >= count and found[count-1][0] <= r * cell:
+                    return [k for d, k in found[:count]]
+                if time() > t_end:
+                    break
+                r += 1
+            else:
+                if rlimit == rmax:
+                    return [k for d, k in found[:count]]
+        found = heapq.nsmallest(count, ((hypot(starts[k][0]-p[0], starts[k][1]-p[1]), k) for k in spans))
+        return [k for d, k in found]
+
+    # nearest neighbour tour, the grid is rebuilt each time half of the spans
+    # left in it have been used so the searches do not walk empty cells
+    tour = []
+    left = set(range(n))
+    grid = make_grid(range(n))
+    size = n
+    p = origin
+    while left and time() < t_end:
+        if len(left) * 2 <= size:
+            grid = make_grid(sorted(left))
+            size = len(left)
+        cells, cell = grid[:2]
+        k = nearest(grid, p, 1)[0]
+        cells[int(floor(starts[k][0]/cell)), int(floor(starts[k][1]/cell))].discard(k)
+        grid[3].discard(k)
+        left.discard(k)
+        tour.append(k)
+        p = ends[k]
+    tour.extend(sorted(left))
+
+    # 2-opt, position 0 is the origin and positions 1..n the spans
+    grid = make_grid(range(n))
+    near = {}
+
+    def gap(a, b):
+        return hypot(b[0]-a[0], b[1]-a[1])
+
+    def prefix_sums():
+        end = [origin] + [ends[k] for k in tour]
+        start = [None] + [starts[k] for k in tour]
+        pos = dict((k, m+1) for m, k in enumerate(tour))
+        pf = [0.0]
+        pb = [0.0, 0.0]
+        for m in range(n):
+            pf.append(pf[-1] + gap(end[m], start[m+1]))
+        for m in range(1, n):
+            pb.append(pb[-1] + gap(end[m+1], start[m]))
+        return end, start, pos, pf, pb
+
+    end, start, pos, pf, pb = prefix_sums()
+    i = 0
+    last = 0
+    while time() < t_end:
+        k = tour[i-1] if i else None
+        if k not in near:
+            near[k] = nearest(grid, end[i], neighbours)
+        a = i+1
+        for c in near[k]:
+            b = pos[c]
+            if b <= a: continue
+            old = pf[b+1] - pf[i] if b < n else pf[b] - pf[i]
+            new = gap(end[i], start[b]) + pb[b] - pb[a]
+            if b < n:
+                new = new + gap(end[a], start[b+1])
+            if new < old - epsilon:
+                tour[a-1:b] = tour[a-1:b][::-1]
+                end, start, pos, pf, pb = prefix_sums()
+                last = i
+                break
+        i = (i+1) % (n-1)
+        if i == last:
+            break
+    return tour
+
+scan_worker_conv = None
+
+def scan_worker_init(conv):
+    global scan_worker_conv
+    scan_worker_conv = conv
+
+def scan_worker(task):
+    return scan_worker_conv.scan_block(*task)
 
 class SimpleEntryCut:
     def __init__(self, feed):
@@ -2771,11 +5651,94 @@ class SimpleEntryCut:
         p = points[0][1]
         if self.feed:
             conv.g.set_feed(self.feed)
-        conv.g.safety()
+        conv.retract(p[0], p[1])
         conv.g.rapid(p[0], p[1])
         if self.feed:
             conv.g.set_feed(conv.feed)
 
+'''################################################################################
+# Enter a span down a ramp at 'angle' degrees that ends at its first point.  The  #
+# ramp runs back and forth over the start of the span, so it only goes over       #
+# material the span takes anyway, folding as often as it has to to get down.  The #
+# tool comes down at rapid to the top of the material left over the ramp, where   #
+# it starts.  The ramp is cut short where the compensated surface along the span  #
+# rises through it, and when that leaves it shorter than the tool is wide the     #
+# tool plunges straight down at 'feed' instead.                                   #
+################################################################################'''
+class RampEntryCut:
+    def __init__(self, feed, angle):
+        self.feed = feed
+        self.slope = tan(angle * pi / 180)
+    def __call__(self, conv, i0, j0, points):
+        x, y, z = points[0][1]
+        run = hypot(points[1][1][0] - x, points[1][1][1] - y) if len(points) > 1 else 0
+        if run == 0:
+            SimpleEntryCut(self.feed)(conv, i0, j0, points); return
+        ux = (points[1][1][0] - x) / run
+        uy = (points[1][1][1] - y) / run
+        # how far the span goes on in the direction it starts in
+        span = (points[-1][1][0] - x) * ux + (points[-1][1][1] - y) * uy
+        span = min(span, (min(0.0, conv.safetyheight) - z) / self.slope)
+        top = min(self.top(conv, x, y, ux, uy, span), conv.safetyheight)
+        if top - z <= conv.tolerance:
+            # nothing left to go down through, so no plunge feed to switch to
+            conv.retract(x, y)
+            conv.g.rapid(x, y)
+            return
+        length = self.length(conv, x, y, z, ux, uy, min(span, (top - z) / self.slope))
+        if length < conv.tool_shape.width * conv.pixelsize:
+            SimpleEntryCut(self.feed)(conv, i0, j0, points); return
+        # the last leg ends at the first point, the ones before it alternate
+        # between the far end and the first point, each a full leg higher; the
+        # first starts part way along where it meets the top of the material
+        rise = length * self.slope
+        legs = int(ceil((top - z) / rise))
+        ends = ((x, y), (x + ux * length, y + uy * length))
+        (ax, ay), (bx, by) = ends[legs % 2], ends[(legs - 1) % 2]
+        f = (z + legs * rise - top) / rise
+        sx = ax + (bx - ax) * f; sy = ay + (by - ay) * f
+        g = conv.g
+        conv.retract(sx, sy)
+        if g.lastz < top: g.rapid(z=top)
+        g.rapid(sx, sy)
+        if g.lastz > top: g.rapid(z=top)
+        for k in range(legs - 1, -1, -1):
+            ex, ey = ends[k % 2]
+            g.cut(ex, ey, z + k * rise)
+        g.flush()
+    def top(self, conv, x, y, ux, uy, span):
+        ''' the highest the material can be over the first 'span' of the span
+            from (x, y) in the direction (ux, uy) '''
+        path = conv.path_pixels(x, y, x + ux * span, y + uy * span)
+        if path is None:
+            return 0.0
+        if conv.level > 0 and conv.cusp is not None:
+            return conv.material_top(path)
+        if conv.stock is None:
+            return 0.0
+        d = -1e1000000
+        for i, j in path:
+            try:
+                s = conv.stock_cache[i,j]
+            except KeyError:
+                conv.stock_cache[i,j] = s = conv.stock.height_calc(i,j,conv.tool_shape)
+            d = max(d, s)
+        return min(0.0, d + conv.tolerance)
+    def length(self, conv, x, y, z, ux, uy, most):
+        pixelsize = conv.pixelsize
+        for k in range(1, int(ceil(most / pixelsize)) + 1):
+            t = k * pixelsize
+            i, j = conv.pixel(x + ux * t, y + uy * t)
+            if i < 0 or i >= conv.h1 or j < 0 or j >= conv.w1:
+                return (k - 1) * pixelsize
+            if conv.get_z(i, j) > z + min(t, most) * self.slope:
+                return (k - 1) * pixelsize
+        return most
+
+def cmp(a, b):
+    ''' -1, 0 or 1 as a is less than, equal to or greater than b '''
+    return (a > b) - (a < b)
+
 def circ(r,b):
     ''' calculate the portion of the arc to do so that none
         is above the safety height, that is just silly '''
@@ -2793,88 +5756,119 @@ class ArcEntryCut:
             p = points[0][1]
             if self.feed:
                 conv.g.set_feed(self.feed)
-            conv.g.safety()
+            conv.retract(p[0], p[1])
             conv.g.rapid(p[0], p[1])
             if self.feed:
                 conv.g.set_feed(conv.feed)
             return
         p1 = points[0][1]
         p2 = points[1][1]
-        z0 = p1[2]
-        lim = int(ceil(self.max_radius / conv.pixelsize))
-        r = range(1, lim)
         if self.feed:
             conv.g.set_feed(self.feed)
-        conv.g.safety()
-        x, y, z = p1
-        pixelsize = conv.pixelsize
         cx = cmp(p1[0], p2[0])
         cy = cmp(p1[1], p2[1])
-        radius = self.max_radius
         if cx != 0:
-            h1 = conv.h1
-            for di in r:
-                dx = di * pixelsize
-                i = i0 + cx * di
-                if i < 0 or i >= h1: break
-                z1 = conv.get_z(i, j0)
-                dz = (z1 - z0)
-                if dz <= 0: continue
-                if dz > dx:
-                    conv.g.write('(case 1)')
-                    radius = dx
-                    break
-                rad1 = (dx * dx / dz + dz) / 2
-                if rad1 < radius:
-                    radius = rad1
-                if dx > radius:
-                    break
+            radius = self.radius(conv, False, j0, i0, cx)
             z1 = min(p1[2] + radius, conv.safetyheight)
             x1 = p1[0] + cx * circ(radius, z1 - p1[2])
+            conv.retract(x1, p1[1])
             conv.g.rapid(x1, p1[1])
             conv.g.cut(z=z1)
             I = - cx * circ(radius, z1 - p1[2])
             K = (p1[2] + radius) - z1
             conv.g.flush(); conv.g.lastgcode = None
             if cx > 0:
-                conv.g.write(f"G3 X{p1[0]} Z{p1[2]} I{I} K{K}")
+                conv.g.write(f"G3 X{p1[0]:.4f} Z{p1[2]:.4f} I{I:.4f} K{K:.4f}")
             else:
-                conv.g.write(f"G2 X{p1[0]} Z{p1[2]} I{I} K{K}")
-            conv.g.lastx = p1[0]
-            conv.g.lasty = p1[1]
-            conv.g.lastz = p1[2]
+                conv.g.write(f"G2 X{p1[0]:.4f} Z{p1[2]:.4f} I{I:.4f} K{K:.4f}")
+            if conv.g.stats is not None:
+                conv.g.stats.arc('G3' if cx > 0 else 'G2', 18, (conv.g.lastx, conv.g.lasty, conv.g.lastz), p1,
+                                 f"I{I:.4f} K{K:.4f}", conv.g.lastfeed)
+            conv.g.moved(*p1)
         else:
-            w1 = conv.w1
-            for dj in r:
-                dy = dj * pixelsize
-                j = j0 - cy * dj
-                if j < 0 or j >= w1: break
-                z1 = conv.get_z(i0, j)
-                dz = (z1 - z0)
-                if dz <= 0: continue
-                if dz > dy:
-                    radius = dy
-                    break
-                rad1 = (dy * dy / dz + dz) / 2
-                if rad1 < radius: radius = rad1
-                if dy > radius: break
+            # the row number goes down as y goes up
+            radius = self.radius(conv, True, i0, j0, -cy)
             z1 = min(p1[2] + radius, conv.safetyheight)
             y1 = p1[1] + cy * circ(radius, z1 - p1[2])
+            conv.retract(p1[0], y1)
             conv.g.rapid(p1[0], y1)
             conv.g.cut(z=z1)
             J =  -cy * circ(radius, z1 - p1[2])
             K = (p1[2] + radius) - z1
             conv.g.flush(); conv.g.lastgcode = None
             if cy > 0:
-                conv.g.write(f"G2 Y{p1[1]} Z{p1[2]} J{J} K{K}")
+                conv.g.write(f"G2 Y{p1[1]:.4f} Z{p1[2]:.4f} J{J:.4f} K{K:.4f}")
             else:
-                conv.g.write(f"G3 Y{p1[1]} Z{p1[2]} J{J} K{K}")
-            conv.g.lastx = p1[0]
-            conv.g.lasty = p1[1]
-            conv.g.lastz = p1[2]
+                conv.g.write(f"G3 Y{p1[1]:.4f} Z{p1[2]:.4f} J{J:.4f} K{K:.4f}")
+            if conv.g.stats is not None:
+                conv.g.stats.arc('G2' if cy > 0 else 'G3', 19, (conv.g.lastx, conv.g.lasty, conv.g.lastz), p1,
+                                 f"J{J:.4f} K{K:.4f}", conv.g.lastfeed)
+            conv.g.moved(*p1)
         if self.feed:
             conv.g.set_feed(conv.feed)
 
+    '''################################################################################
+    # The radius of the entry arc at pixel i of row 'line', or column when 'cols',    #
+    # coming in along it from the side s (1 for higher pixel numbers, -1 for lower).  #
+    # The arc is as big as max_radius allows without passing through the surface      #
+    # ahead of it.  With NumPy the radii of every pixel of the line are worked out at #
+    # once from the compensated surface along it and kept for the other spans that    #
+    # start on it, until the roughing level changes.                                  #
+    ################################################################################'''
+    def radius(self, conv, cols, line, i, s):
+        lim = int(ceil(self.max_radius / conv.pixelsize))
+        if NUMPY:
+            if conv.entry_level != conv.rd:
+                conv.entry_level = conv.rd
+                conv.entry_radii = {}
+            key = (cols, line, s)
+            try:
+                radii = conv.entry_radii[key]
+            except KeyError:
+                n = conv.w1 if cols else conv.h1
+                z = conv.line_heights(cols, line, numpy.arange(n))
+                z = numpy.minimum(numpy.maximum(z, conv.rd), 0.0).astype('float64')
+                radii = conv.entry_radii[key] = entry_radii(z, s, lim, conv.pixelsize, self.max_radius)
+            return float(radii[i])
+        n = conv.w1 if cols else conv.h1
+        z0 = conv.get_z(line, i) if cols else conv.get_z(i, line)
+        radius = self.max_radius
+        for d in range(1, lim):
+            k = i + s * d
+            if k < 0 or k >= n: break
+            z1 = conv.get_z(line, k) if cols else conv.get_z(k, line)
+            dx = d * conv.pixelsize
+            dz = z1 - z0
+            if dz <= 0: continue
+            if dz > dx:
+                return dx
+            radius = min(radius, (dx * dx / dz + dz) / 2)
+            if dx > radius: break
+        return radius
+
+def entry_radii(z, s, lim, pixelsize, max_radius):
+    ''' ArcEntryCut.radius for every pixel of the line of heights z at once,
+        stepping out from all of them together '''
+    n = len(z)
+    radius = numpy.full(n, float(max_radius))
+    active = numpy.ones(n, bool)
+    idx = numpy.arange(n)
+    for d in range(1, lim):
+        k = idx + s * d
+        active &= (k >= 0) & (k < n)
+        if not active.any():
+            break
+        dx = d * pixelsize
+        dz = z[numpy.clip(k, 0, n-1)] - z
+        rising = active & (dz > 0)
+        steep = rising & (dz > dx)
+        radius[steep] = dx
+        rising &= ~steep
+        rad1 = (dx * dx / numpy.where(rising, dz, 1.0) + dz) / 2
+        radius = numpy.where(rising, numpy.minimum(radius, rad1), radius)
+        active &= ~steep & ~(rising & (dx > radius))
+    return radius
+
 class Image_Matrix_List:
     ''' nested list, no numpy '''
     def __init__(self, width=0, height=0):
@@ -2898,6 +5892,13 @@ class Image_Matrix_List:
             for y in range(s):
                 self.apj(x,float(input_list[x][y]))
 
+    def From_Array(self, rows):
+        self.matrix = [[float(val) for val in row] for row in rows]
+        self.width  = len(self.matrix)
+        self.height = len(self.matrix[0])
+        self.shape  = [self.width, self.height]
+        self.t_offset = 0
+
     def FromImage(self, im, pil_format):
         self.matrix = []
         if pil_format:
@@ -3010,6 +6011,12 @@ class Image_Matrix_Numpy:
             for y in range(s):
                 self.matrix[x,y]=float(input_list[x][y])
 
+    def From_Array(self, rows):
+        self.matrix = numpy.array(rows, 'float32')
+        self.width, self.height = self.matrix.shape
+        self.shape  = [self.width, self.height]
+        self.t_offset = 0
+
     def FromImage(self, im, pil_format):
         self.matrix = []
         if pil_format:
@@ -3100,18 +6107,20 @@ if NUMPY == True:
 else:
     Image_Matrix = Image_Matrix_List
 
-root = Tk()
-app = Application(root)
-app.master.title('dmap2gcode V'+version)
-app.master.iconname('dmap2gcode')
-app.master.minsize(MIN_SIZE[0], MIN_SIZE[1])
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    root = Tk()
+    app = Application(root)
+    app.master.title('dmap2gcode V'+version)
+    app.master.iconname('dmap2gcode')
+    app.master.minsize(MIN_SIZE[0], MIN_SIZE[1])
 
 
-'''#####################
-#      scorch icon     #
-#####################'''
-try:
-    scorch_ico_B64=b'R0lGODlhEAAQAIYAAA\
+    '''#####################
+    #      scorch icon     #
+    #####################'''
+    try:
+        scorch_ico_B64=b'R0lGODlhEAAQAIYAAA\
     AAABAQEBYWFhcXFxsbGyUlJSYmJikpKSwsLC4uLi8vLzExMTMzMzc3Nzg4ODk5OTs7Oz4+PkJCQkRERE\
     VFRUtLS0xMTE5OTlNTU1dXV1xcXGBgYGVlZWhoaGtra3FxcXR0dHh4eICAgISEhI+Pj5mZmZ2dnaKioq\
     Ojo62tra6urrS0tLi4uLm5ub29vcLCwsbGxsjIyMzMzM/Pz9PT09XV1dbW1tjY2Nzc3OHh4eLi4uXl5e\
@@ -3124,9 +6133,9 @@ try:
     aAWCFDA4EDSQInwaDACBEAImLwCAFARw4HFJJcgGADyZEAL3YQcMGBBpIjHx4EeIGkRoMFJgakWADABx\
     IkPwIgcIGkdm0AMJDo1g3jQBIBRZAINyKAwxEkyHEUSMIcwYYbEgwYmQGgyI8SD5Jo327hgIIAAQ5cBs\
     CQpHySgAA7'
-    icon_im = PhotoImage(data=scorch_ico_B64, format='gif')
-    root.call('wm', 'iconphoto', root._w, '-default', icon_im)
-except:
-    pass
+        icon_im = PhotoImage(data=scorch_ico_B64, format='gif')
+        root.call('wm', 'iconphoto', root._w, '-default', icon_im)
+    except:
+        pass
 
-root.mainloop()
+    root.mainloop()